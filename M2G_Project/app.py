@@ -1,93 +1,72 @@
+import json
+import logging
+import os
+import threading
+from functools import partial
+
 import flet as ft
 
-# --- CONFIGURAZIONE ---
-# NOTA: Ho RIMOSSO lo slash "/" iniziale. 
-# Con assets_dir="assets", Flet cerca direttamente dentro quella cartella.
-BOOKS_DATA = {
-    "Lodi Mattutine": ["lodi1.jpg", "lodi2.jpg", "lodi3.jpg", "lodi4.jpg", "lodi5.jpg"],
-    "Libretto": ["lib1.jpg", "lib2.jpg", "lib3.jpg", "lib4.jpg", "lib5.jpg"],
-    "Foto ricordo": [] 
-}
+import audio
+from avatar import avatar_path, make_avatars, remove_avatars
+from catalog import Catalog
+from notes_store import NotesJournal
+import paper
+import perf
+import search
+from scheduler import Debouncer, FrameBatcher, IdlePrefetcher, Latest, offload
+from settings import load_settings, save_settings
+from tiles import TileViewer
+from virtual_list import VirtualList, text_chunks, text_height
+
+logger = logging.getLogger("m2g")
 
-FEATHER_MAP = {
+# --- CONFIGURAZIONE ---
+# Gli asset sorgente stanno in assets_src/; build_assets.py li copia in assets/ con il
+# contenuto nel nome (sunrise.3f9a0c1b2d.svg) e scrive assets/manifest.json. Senza
+# bundle l'app usa direttamente assets_src/ e i nomi logici.
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+ASSETS_SRC_DIR = os.path.join(APP_DIR, "assets_src")
+BUNDLE_DIR = os.path.join(APP_DIR, "assets")
+ASSET_MANIFEST = "manifest.json"
+
+def load_asset_manifest(folder=BUNDLE_DIR):
+    try:
+        with open(os.path.join(folder, ASSET_MANIFEST), encoding="utf-8") as f:
+            return json.load(f).get("files", {})
+    except: return {}
+
+ASSET_FILES = load_asset_manifest()
+ASSETS_DIR = BUNDLE_DIR if ASSET_FILES else ASSETS_SRC_DIR
+
+def asset(name):
+    # Nome logico -> file nel bundle
+    return ASSET_FILES.get(name, name)
+
+# Card, libretti e testi: catalog/index.json, i contenuti si leggono all'apertura
+CATALOG = Catalog(ASSETS_DIR, asset)
+
+# Pagine ridimensionate generate da build_assets.py (facoltative: senza manifest si usano gli originali)
+PAGES_MANIFEST = "pages/manifest.json"
+PAGE_DISPLAY_WIDTH = 350
+PAGE_GAP = 10
+PAGE_WINDOW = 2  # pagine tenute in memoria oltre quelle visibili, sopra e sotto
+TEXT_WINDOW = 3  # strofe montate oltre quelle visibili
+TEXT_PADDING = 20
+TEXT_GAP = 24
+SEARCH_DELAY = 0.15  # attesa dopo l'ultimo tasto prima di cercare
+
+# Prefetch a riposo: prime pagine di ogni libretto e testi dei canti
+PREFETCH_PAGES = 2                  # pagine per libretto, in ordine
+PREFETCH_BUDGET = 1_500_000         # byte scaricati al massimo
+PREFETCH_MEMORY = 32 * 1024 * 1024  # byte decodificati tenuti vivi dal client
+
+FEATHER_MAP = {key: asset(name) for key, name in {
     "sunrise": "sunrise.svg", "book-open": "book-open.svg", "music": "music.svg", 
     "camera": "camera.svg", "chevron-right": "chevron-right.svg", "home": "home.svg", 
     "user": "user.svg", "arrow-left": "arrow-left.svg", "save": "save.svg", 
     "edit": "edit.svg", "play": "play-circle.svg", "pause": "pause-circle.svg", 
-    "stop": "stop-circle.svg"
-}
-
-LYRICS_TEXT = """
-Lo sai che ti amo
-Ma a volte è difficile sai?
-Io mi perdo, mi strappo
-E arriviamo sempre allo stesso punto
-
-Sono le nove e fuori piove
-Il cielo è pieno di te
-I tuoi capelli scintillano sotto la Luna
-E la tua bianca pelle mi ricorda la radura
-
-Il mio amore per te
-È lapalissiano
-Io so chi siamo
-Solo quando sto con te
-Ti respiro cosi forte
-Da rimanerne asfissiato
-E solo se ti metti di lato
-Posso mostrarti con le mani
-Quanto ti amo perché
-
-Sono l'eroe
-Che ucciderà i mostri
-Sotto al tuo letto
-Mentre riposi
-E non importa se non dormirò
-Li distruggo tutti e poi ripartirò (oooh)
-(Dammi il tuo cuore baby)
-
-"Hey pronto amore mio perché non vieni qui a casa mia?
-Sono da sola... c'è la mia coperta calda che ti piace tanto, 
-i pop corn... e poi guardiamo un film... dai che ho il ciclo 
-e non mi sento tanto bene... allora ciao, a dopo amore..."
-
-Sono le nove e fuori piove
-Anche stasera un segone
-Te l'ho detto
-Se hai le mestruazioni non mi cercare
-Se poi arrivo
-E non possiamo più nemmeno scopare
-Eppure sai che c'è
-Sperimentiamo
-Analizziamo
-Di orifizi tu ne hai tre
-Quando sto con te mi diventa duro
-Mi devi dare il culo
-Non lo diciamo a nessuno
-Sborro come Nettuno
-
-Sono l'eroe
-Che ucciderà i mostri
-Sotto al tuo letto
-Mentre riposi
-E non importa se non me la dai
-Ti distruggo il culo mentre dormirai
-
-Sono l'eroe
-Che ucciderà i mostri
-Sotto al tuo letto
-Mentre riposi
-E non importa se non me la dai
-Ti distruggo il culo mentre dormirai
-
-Sono l'eroe
-Che ucciderà i mostri
-Sotto al tuo letto
-Mentre riposi
-E non importa se non me la dai
-Ti distruggo il culo mentre dormirai
-E non importa
-"""
+    "stop": "stop-circle.svg", "search": "search.svg"
+}.items()}
 
 COLORS = {
     "light": {
@@ -102,375 +81,797 @@ COLORS = {
     }
 }
 
+def load_pages_manifest():
+    try:
+        with open(os.path.join(ASSETS_DIR, asset(PAGES_MANIFEST)), encoding="utf-8") as f:
+            return json.load(f).get("pages", {})
+    except: return {}
+
+def pick_page_src(img, display_width, dpr, manifest):
+    # La variante più piccola abbastanza nitida per larghezza x densità; altrimenti l'originale
+    entry = manifest.get(img)
+    if not entry: return img
+    needed = display_width * dpr
+    for v in sorted(entry["variants"], key=lambda v: v["w"]):
+        if v["w"] >= needed: return v["src"]
+    return img
+
+def device_pixel_ratio(page):
+    # Flet non espone il devicePixelRatio: stima prudente per piattaforma
+    try:
+        if page.platform in (ft.PagePlatform.ANDROID, ft.PagePlatform.IOS): return 3.0
+        if page.web: return 2.0
+    except: pass
+    return 1.0
+
 def main(page: ft.Page):
+    startup = perf.PhaseTimer("startup")
+
     # Configurazione iniziale minima
     page.title = "M2G App"
     page.bgcolor = "white"
     page.padding = 0
     page.spacing = 0
     page.safe_area = ft.SafeArea(content=None)
-    
-    # --- AUDIO (Safe Load) ---
-    audio_player = None
-    try:
-        # Percorso senza slash iniziale
-        audio_player = ft.Audio(src="inno.mp3", autoplay=False, release_mode="stop")
-        page.overlay.append(audio_player)
-    except: pass
 
     # --- DATI ---
-    def get_stored_data():
+    data = load_settings(page.client_storage)
+    startup.mark("settings")
+
+    # Le scritture vengono accorpate: un solo salvataggio dopo l'ultima modifica
+    settings_writer = Debouncer(perf.handler("settings_write", lambda: save_settings(page.client_storage, data)), delay=0.6)
+    ui_batch = FrameBatcher(page)
+    ui_batch.flush = perf.handler("ui_batch", ui_batch.flush)
+
+    def store(**fields):
+        data.update(fields)
+        settings_writer()
+
+    # Note: journal di delta con autosalvataggio in background (caricato all'apertura delle note o della ricerca)
+    notes_journal = notes_text = None
+    notes_lock = threading.Lock()
+    notes_writer = Debouncer(perf.handler("notes_write", lambda: save_notes_now()), delay=1.5)
+
+    def save_notes_now():
         try:
-            saved_pic = page.client_storage.get("profile_pic") or "user.svg"
-            # Pulizia percorsi Windows
-            if "C:" in saved_pic or "\\" in saved_pic or saved_pic.startswith("/"): 
-                saved_pic = "user.svg"
-            
-            return {
-                "name": page.client_storage.get("user_name") or "Utente",
-                "notes": page.client_storage.get("user_notes") or "",
-                "font": float(page.client_storage.get("font_size") or 16.0),
-                "dark": page.client_storage.get("dark_mode") or False,
-                "pic": saved_pic
-            }
+            notes_journal.save(notes_input_full.value or "")
+            return True
         except:
-             return {"name": "Utente", "notes": "", "font": 16.0, "dark": False, "pic": "user.svg"}
-    
-    data = get_stored_data()
+            return False
+
+    def flush_pending():
+        settings_writer.flush()
+        notes_writer.flush()
+        ui_batch.flush()
     
     state = {
         "font_size": data["font"],
         "is_dark": data["dark"],
-        "audio_playing": False
+        "notes_saved": False  # icona di salvataggio verde fino alla modifica successiva
     }
 
     def get_c(key):
         return COLORS["dark" if state["is_dark"] else "light"][key]
 
-    # --- FILE PICKER ---
-    def on_file_picked(e):
-        if e.files:
-            path = e.files[0].path
-            page.client_storage.set("profile_pic", path)
-            img_profile_view.src = path
-            img_profile_view.color = None
-            nav_user_img.src = path
-            nav_user_img.color = None
-            nav_user_img.border_radius = 50
+    # --- TEMA ---
+    # Ogni controllo dichiara le chiavi della palette che usa (o una funzione di get_c);
+    # a ogni cambio di tema o di scheda si toccano solo le proprietà il cui valore cambia.
+    theme_bindings = []
+
+    def themed(control, **props):
+        for attr, value in props.items(): theme_bindings.append([control, attr, value, None])
+        return control
+
+    def apply_theme():
+        dirty = {}
+        for b in theme_bindings:
+            control, attr, value, last = b
+            new = get_c(value) if isinstance(value, str) else value(get_c)
+            if new != last:
+                setattr(control, attr, new)
+                b[3] = new
+                dirty[id(control)] = control
+        return list(dirty.values())
+
+    pages_manifest = load_pages_manifest()
+
+    def page_variant(img):
+        width = min(PAGE_DISPLAY_WIDTH, page.width - 20) if page.width else PAGE_DISPLAY_WIDTH
+        return pick_page_src(img, width, device_pixel_ratio(page), pages_manifest)
+
+    def page_src(img):
+        return asset(page_variant(img))
+
+    def page_cost(img):
+        # (byte del file, byte decodificati) della variante che il lettore mostrerebbe
+        size = os.path.getsize(os.path.join(ASSETS_DIR, page_src(img)))
+        entry = pages_manifest.get(img)
+        if not entry: return size, 4 * size * 10  # senza dimensioni: stima da JPEG ~10:1
+        variant = page_variant(img)
+        w = next((v["w"] for v in entry["variants"] if v["src"] == variant), entry["width"])
+        return size, 4 * w * round(w * entry["height"] / entry["width"])
+
+    # --- OVERLAY (creati al primo uso) ---
+    # Il player di un canto si crea e comincia a caricare quando l'utente va verso la card
+    # (hover o primo tocco) e si rilascia alla chiusura del lettore
+    song_audio = audio.AudioManager(page, on_status=lambda s: show_audio_status(s))
+    audio_ui = {}
+    file_picker = None
+
+    def pic_src(key):
+        # Le miniature stanno nella cartella dati dell'app; l'icona di default negli asset
+        return FEATHER_MAP["user"] if is_svg_pic() else avatar_path(data[key])
+
+    @perf.timed("on_file_picked")
+    async def on_file_picked(e):
+        if not (e.files and e.files[0].path): return
+        # Nel pool: ritaglio e riduzione della foto, poi solo le miniature vanno in UI
+        try: names = await offload(make_avatars, e.files[0].path)
+        except Exception:
+            # Formato che Pillow non legge (es. HEIC) o file illeggibile: la foto resta quella di prima
+            logger.exception("foto profilo non caricata: %s", e.files[0].path)
+            if lbl_pic_error:
+                lbl_pic_error.visible = True
+                ui_batch.request(lbl_pic_error)
+            return
+        if lbl_pic_error and lbl_pic_error.visible:
+            lbl_pic_error.visible = False
+            ui_batch.request(lbl_pic_error)
+        store(pic=names["profile"], pic_nav=names["nav"])
+        await offload(settings_writer.flush)
+        await offload(partial(remove_avatars, keep=names.values()))
+        nav_user_img.src = pic_src("pic_nav")
+        if img_profile_view: img_profile_view.src = pic_src("pic")
+        update_interface_colors(*[c for c in (img_profile_view, nav_user_img) if c])
+
+    @perf.timed("pick_profile_pic")
+    def pick_profile_pic(e):
+        nonlocal file_picker
+        if file_picker is None:
+            file_picker = ft.FilePicker(on_result=on_file_picked)
+            page.overlay.append(file_picker)
             page.update()
-            
-    file_picker = ft.FilePicker(on_result=on_file_picked)
-    page.overlay.append(file_picker)
+        file_picker.pick_files(allow_multiple=False, file_type=ft.FilePickerFileType.IMAGE)
+
+    def is_svg_pic(): return "user.svg" in data["pic"]
 
     # --- UI COMPONENTS ---
     
     # Header
-    txt_welcome_name = ft.Text(f"Bentornato, {data['name']}", size=24, weight="w400")
-    header_logo = ft.Container(width=65, height=65, border_radius=18, alignment=ft.Alignment(0, 0), content=ft.Text("M2G", color="white", size=22, weight="w300"))
-    header_container = ft.Container(padding=ft.padding.only(top=20, bottom=20, left=20, right=20), content=ft.Column(horizontal_alignment=ft.CrossAxisAlignment.CENTER, spacing=15, controls=[header_logo, txt_welcome_name]))
-
-    # User Page
-    is_svg_start = "user.svg" in data["pic"]
-    img_profile_view = ft.Image(src=data["pic"], width=150, height=150, border_radius=75, fit="cover", color=get_c("primary") if is_svg_start else None)
-    container_profile_border = ft.Container(content=img_profile_view, border_radius=100, padding=5, border=ft.border.all(3, "transparent"))
-    
-    txt_name_input = ft.TextField(value=data["name"], label="Il tuo nome", max_length=14)
-    btn_upload_photo = ft.ElevatedButton("CARICA DALLA GALLERIA", color="white", on_click=lambda _: file_picker.pick_files(allow_multiple=False, file_type=ft.FilePickerFileType.IMAGE))
-    
-    btn_open_notes_user = ft.Container(border_radius=10, padding=15, width=300) 
-    lbl_font_size = ft.Text(f"Grandezza Testo: {int(state['font_size'])}")
-    slider_font = ft.Slider(min=12, max=30, divisions=18, value=state["font_size"])
-    switch_theme = ft.Switch(value=state["is_dark"])
-
-    user_view_content = ft.Column(
-        scroll="auto", horizontal_alignment=ft.CrossAxisAlignment.CENTER, spacing=15,
-        controls=[
-            ft.Container(height=10),
-            ft.Text("Il tuo Profilo", size=20, weight="bold"),
-            container_profile_border,
-            ft.Container(width=280, content=txt_name_input),
-            ft.Divider(),
-            btn_open_notes_user,
-            ft.Divider(),
-            btn_upload_photo,
-            ft.Divider(),
-            ft.Text("Impostazioni", size=18, weight="bold"),
-            ft.Container(padding=10, content=ft.Column(controls=[
-                ft.Row([ft.Text("Modalità Notte"), switch_theme], alignment=ft.MainAxisAlignment.SPACE_BETWEEN),
-                ft.Container(height=10),
-                lbl_font_size,
-                slider_font
-            ])),
-            ft.Container(height=120) 
-        ]
-    )
-
-    # Note Page
-    notes_input_full = ft.TextField(
-        value=data["notes"], multiline=True, min_lines=30, max_length=10000,
-        border=ft.InputBorder.NONE, text_size=state["font_size"], bgcolor="transparent", content_padding=ft.padding.only(top=5, left=5)
-    )
-    lines_background = ft.Column(spacing=0)
-    btn_close_notes = ft.Container(padding=10, content=ft.Image(src=FEATHER_MAP["arrow-left"], width=24, height=24))
-    btn_save_notes = ft.Container(padding=10, content=ft.Image(src=FEATHER_MAP["save"], width=24, height=24))
-    
-    notes_container = ft.Container(
-        expand=True, padding=20,
-        offset=ft.Offset(1, 0), animate_offset=ft.Animation(400, ft.AnimationCurve.EASE_OUT_CUBIC),
-        opacity=0, animate_opacity=300,
-        content=ft.Column(controls=[
-            ft.Row(alignment=ft.MainAxisAlignment.SPACE_BETWEEN, controls=[
-                btn_close_notes,
-                ft.Text("Le tue Note", size=20, weight="bold"),
-                btn_save_notes
-            ]),
-            ft.Divider(color="transparent", height=10),
-            ft.Container(
-                expand=True, border_radius=5, padding=ft.padding.symmetric(horizontal=15, vertical=10),
-                shadow=ft.BoxShadow(blur_radius=5, color="#22000000", offset=ft.Offset(2,2)),
-                content=ft.Column(scroll="auto", controls=[ft.Stack(controls=[lines_background, notes_input_full])])
-            )
-        ])
-    )
-
-    # Reader Page
-    reader_title = ft.Text("Titolo", size=20, weight="bold")
-    reader_col = ft.Column(spacing=10, horizontal_alignment=ft.CrossAxisAlignment.CENTER)
-    reader_scroll = ft.Column(scroll="auto", expand=True, controls=[reader_col], horizontal_alignment=ft.CrossAxisAlignment.CENTER)
-    btn_close_reader = ft.Container(padding=10, content=ft.Image(src=FEATHER_MAP["arrow-left"], width=24, height=24))
-    
-    reader_container = ft.Container(
-        expand=True, padding=0,
-        offset=ft.Offset(1, 0), animate_offset=ft.Animation(400, ft.AnimationCurve.EASE_OUT_CUBIC),
-        opacity=0, animate_opacity=300,
-        content=ft.Column(controls=[
-            ft.Container(padding=20, content=ft.Row(controls=[btn_close_reader, ft.Container(width=10), reader_title])),
-            ft.Divider(height=1, color="#e0e0e0"),
-            ft.Container(expand=True, content=reader_scroll)
-        ])
-    )
+    txt_welcome_name = themed(ft.Text(f"Bentornato, {data['name']}", size=24, weight="w400"), color="text")
+    header_logo = themed(ft.Container(width=65, height=65, border_radius=18, alignment=ft.Alignment(0, 0), content=ft.Text("M2G", color="white", size=22, weight="w300")), bgcolor="primary")
+    btn_search = ft.Container(padding=8, content=themed(ft.Image(src=FEATHER_MAP["search"], width=22, height=22), color="text"))
+    header_container = ft.Container(padding=ft.padding.only(top=20, bottom=20, left=20, right=20), content=ft.Column(horizontal_alignment=ft.CrossAxisAlignment.CENTER, spacing=15, controls=[
+        header_logo, ft.Row(alignment=ft.MainAxisAlignment.CENTER, controls=[txt_welcome_name, btn_search])
+    ]))
 
     # Home & Nav
-    cards_column = ft.Column(scroll="auto", spacing=20)
-    dynamic_content = ft.Container(content=cards_column, expand=True, padding=ft.padding.symmetric(horizontal=25))
-    btn_home_container = ft.Container(border_radius=10, padding=10, width=140)
-    btn_user_container = ft.Container(border_radius=10, padding=10, width=140)
-    
-    nav_home_img = ft.Image(src=FEATHER_MAP["home"], width=20, height=20)
-    nav_user_img = ft.Image(src=data["pic"], width=20, height=20, fit="cover", border_radius=50 if not is_svg_start else 0)
-
-    custom_navbar = ft.Container(
+    cards_column = ft.Column(scroll="auto", spacing=20, expand=True)
+
+    async def open_card(e):
+        await open_reader(e.control.data)
+
+    for item in CATALOG.items():
+        action = perf.handler("open_link", lambda e, url=item["url"]: page.launch_url(url)) if item["kind"] == "link" else open_card
+        hover = perf.handler("card_hover", lambda e, src=asset(item["audio"]): e.data == "true" and song_audio.preload(src)) if item.get("audio") else None
+        icon = item["icon"] if item.get("icon") in FEATHER_MAP else "book-open"
+        cards_column.controls.append(themed(ft.Container(
+            border_radius=22, padding=15, height=80, data=item["id"], on_click=action, on_hover=hover,
+            shadow=ft.BoxShadow(spread_radius=0, blur_radius=15, color="#0D000000", offset=ft.Offset(0, 5)),
+            content=ft.Row(alignment=ft.MainAxisAlignment.SPACE_BETWEEN, controls=[
+                ft.Row(controls=[
+                    themed(ft.Container(width=50, height=50, border_radius=14, alignment=ft.Alignment(0, 0), content=themed(ft.Image(src=FEATHER_MAP[icon], width=24, height=24), color="primary")), bgcolor="icon_bg"),
+                    ft.Container(width=10),
+                    themed(ft.Text(item["title"], size=16, weight="bold"), color="text")
+                ]),
+                ft.Image(src=FEATHER_MAP["chevron-right"], width=24, color="#dddddd")
+            ])
+        ), bgcolor="card"))
+    cards_column.controls.append(ft.Container(height=50))
+    # Le schede, una volta costruite, restano montate: cambiare scheda è solo un cambio di visibilità
+    tabs_column = ft.Column(spacing=0, expand=True, controls=[cards_column])
+    dynamic_content = ft.Container(content=tabs_column, expand=True, padding=ft.padding.symmetric(horizontal=25))
+
+    def is_home(): return cards_column.visible
+    def nav_fg(selected): return lambda c: "white" if selected() else c("text")
+    def nav_bg(selected): return lambda c: c("primary") if selected() else c("nav_bg")
+    is_profile = lambda: not is_home()
+
+    nav_home_img = themed(ft.Image(src=FEATHER_MAP["home"], width=20, height=20), color=nav_fg(is_home))
+    nav_user_img = themed(ft.Image(src=pic_src("pic_nav"), width=20, height=20, fit="cover"),
+        color=lambda c: nav_fg(is_profile)(c) if is_svg_pic() else None, border_radius=lambda c: 0 if is_svg_pic() else 50)
+    btn_home_container = themed(ft.Container(border_radius=10, padding=10, width=140, content=ft.Row(alignment=ft.MainAxisAlignment.CENTER, controls=[
+        nav_home_img, themed(ft.Text("HOME", weight="bold"), color=nav_fg(is_home))
+    ])), bgcolor=nav_bg(is_home))
+    btn_user_container = themed(ft.Container(border_radius=10, padding=10, width=140, content=ft.Row(alignment=ft.MainAxisAlignment.CENTER, controls=[
+        nav_user_img, themed(ft.Text("PROFILO", weight="bold"), color=nav_fg(is_profile))
+    ])), bgcolor=nav_bg(is_profile))
+
+    custom_navbar = themed(ft.Container(
         padding=15, border_radius=ft.border_radius.only(top_left=20, top_right=20),
         shadow=ft.BoxShadow(blur_radius=10, color="#11000000"),
         content=ft.Row(alignment=ft.MainAxisAlignment.SPACE_AROUND, controls=[btn_home_container, btn_user_container])
-    )
-
-    # --- LOGICA ---
-    def update_interface_colors():
-        c = get_c
-        bg, fg, primary = c("bg"), c("text"), c("primary")
-        page.bgcolor = bg
-        header_logo.bgcolor = primary
-        txt_welcome_name.color = fg
+    ), bgcolor="nav_bg")
+    themed(page, bgcolor="bg")
+
+    # Livello invisibile sotto a tutto: il client vi scarica e decodifica le pagine in anticipo
+    warm_layer = ft.Stack(width=1, height=1, left=0, top=0, opacity=0)
+    home_column = ft.Column(alignment=ft.MainAxisAlignment.SPACE_BETWEEN, controls=[header_container, dynamic_content, custom_navbar])
+    screens_stack = ft.Stack(controls=[warm_layer, home_column])
+    startup.mark("home")
+
+    # --- SCHERMATE (costruite al primo uso) ---
+    # Profilo, note e lettore non servono per il primo frame: vengono create la prima
+    # volta che l'utente le apre e da lì in poi restano montate.
+    user_view_content = img_profile_view = lbl_font_size = lbl_pic_error = None
+    notes_container = notes_input_full = btn_save_notes = None
+    reader_container = reader_title = reader_col = reader_scroll = reader_body = None
+    pages_view = text_view = song_header = song_body = None
+    zoom_container = zoom_title = zoom_viewer = None
+    reader_work = Latest()
+    search_container = search_input = search_results = notes_search = None
+
+    def mount(parent, control):
+        # I binding appena registrati prendono i colori prima del primo invio
+        apply_theme()
+        parent.controls.append(control)
+        parent.update()
+
+    def build_user_view():
+        nonlocal user_view_content, img_profile_view, lbl_font_size, lbl_pic_error
+        img_profile_view = themed(ft.Image(src=pic_src("pic"), width=150, height=150, border_radius=75, fit="cover"), color=lambda c: c("primary") if is_svg_pic() else None)
+        container_profile_border = themed(ft.Container(content=img_profile_view, border_radius=100, padding=5), border=lambda c: ft.border.all(3, c("primary")))
         
-        # User colors
-        txt_name_input.color = fg
-        txt_name_input.border_color = primary
-        btn_upload_photo.bgcolor = primary
-        container_profile_border.border = ft.border.all(3, primary)
+        txt_name_input = themed(ft.TextField(value=data["name"], label="Il tuo nome", max_length=14, on_change=on_name_change), color="text", border_color="primary")
+        btn_upload_photo = themed(ft.ElevatedButton("CARICA DALLA GALLERIA", color="white", on_click=pick_profile_pic), bgcolor="primary")
+        lbl_pic_error = ft.Text("Impossibile leggere questa foto: scegline una in JPEG o PNG", color="red", size=12, visible=False)
         
-        is_svg = "user.svg" in img_profile_view.src
-        img_profile_view.color = primary if is_svg else None
-        
-        btn_open_notes_user.bgcolor = primary
-        btn_open_notes_user.content = ft.Row(alignment=ft.MainAxisAlignment.CENTER, controls=[
+        btn_open_notes_user = themed(ft.Container(border_radius=10, padding=15, width=300, on_click=open_notes, content=ft.Row(alignment=ft.MainAxisAlignment.CENTER, controls=[
             ft.Image(src=FEATHER_MAP["edit"], width=20, height=20, color="white"),
             ft.Text("APRI LE TUE NOTE", color="white", weight="bold")
-        ])
+        ])), bgcolor="primary")
+        lbl_font_size = themed(ft.Text(f"Grandezza Testo: {int(state['font_size'])}"), color="text")
+        slider_font = themed(ft.Slider(min=12, max=30, divisions=18, value=state["font_size"], on_change=on_font_change, on_change_end=on_font_change_end), active_color="primary")
+        switch_theme = themed(ft.Switch(value=state["is_dark"], on_change=on_theme_change), active_color="primary")
+
+        user_view_content = ft.Column(
+            scroll="auto", expand=True, visible=False, horizontal_alignment=ft.CrossAxisAlignment.CENTER, spacing=15,
+            controls=[
+                ft.Container(height=10),
+                themed(ft.Text("Il tuo Profilo", size=20, weight="bold"), color="text"),
+                container_profile_border,
+                ft.Container(width=280, content=txt_name_input),
+                ft.Divider(),
+                btn_open_notes_user,
+                ft.Divider(),
+                btn_upload_photo,
+                lbl_pic_error,
+                ft.Divider(),
+                themed(ft.Text("Impostazioni", size=18, weight="bold"), color="text"),
+                ft.Container(padding=10, content=ft.Column(controls=[
+                    ft.Row([themed(ft.Text("Modalità Notte"), color="text"), switch_theme], alignment=ft.MainAxisAlignment.SPACE_BETWEEN),
+                    ft.Container(height=10),
+                    lbl_font_size,
+                    slider_font
+                ])),
+                ft.Container(height=120) 
+            ]
+        )
+        mount(tabs_column, user_view_content)
+
+    def load_notes():
+        # Il journal si legge una volta sola (fuori dal loop), dalla prima fra note, ricerca e prefetch.
+        # Se la lettura fallisce si restituisce None e si riprova al prossimo uso: un journal
+        # non caricato salverebbe i delta su un testo vuoto, scartati al riavvio.
+        nonlocal notes_journal, notes_text
+        with notes_lock:
+            if notes_journal is None:
+                journal = NotesJournal(page.client_storage)
+                try: notes_text = journal.load(fallback=data.get("notes", ""))
+                except: return None
+                notes_journal = journal
+                # Le note migrate dalle impostazioni ora sono nello snapshot del journal:
+                # solo adesso si possono togliere dal documento
+                if data.pop("notes", None) is not None: settings_writer()
+        return notes_text
+
+    def current_notes():
+        # Il testo attuale: quello del campo, se le note sono già state aperte e caricate
+        if notes_input_full and not notes_input_full.read_only: return notes_input_full.value or ""
+        return load_notes()
+
+    def build_notes():
+        nonlocal notes_container, notes_input_full, btn_save_notes
+        notes_input_full = themed(ft.TextField(
+            value=notes_text or "", read_only=notes_journal is None, multiline=True, min_lines=30, max_length=10000, on_change=on_notes_change,
+            border=ft.InputBorder.NONE, text_size=state["font_size"], text_style=paper.text_style(state["font_size"]),
+            bgcolor="transparent", content_padding=ft.padding.only(left=5)
+        ), color="text")
+        # Le righe sono lo sfondo del campo stesso: seguono testo e corpo (vedi paper.py)
+        dpr = device_pixel_ratio(page)
+        notes_paper = themed(ft.Container(content=notes_input_full), image=lambda c: paper.ruled(c("paper_line"), state["font_size"], dpr))
+        btn_close_notes = ft.Container(padding=10, on_click=close_notes, content=themed(ft.Image(src=FEATHER_MAP["arrow-left"], width=24, height=24), color="text"))
+        btn_save_notes = ft.Container(padding=10, on_click=save_notes, content=themed(ft.Image(src=FEATHER_MAP["save"], width=24, height=24), color=lambda c: "green" if state["notes_saved"] else c("primary")))
         
-        user_view_content.controls[1].color = fg
-        user_view_content.controls[9].color = fg
-        user_view_content.controls[10].content.controls[0].controls[0].color = fg
-        lbl_font_size.color = fg
-        slider_font.active_color = primary
-        switch_theme.active_color = primary
-
-        # Note colors
-        notes_container.bgcolor = bg
-        notes_container.content.controls[0].controls[1].color = fg
-        btn_close_notes.content.color = fg
-        btn_save_notes.content.color = primary
-        notes_container.content.controls[2].bgcolor = c("paper_bg")
-        notes_input_full.color = fg
-        lines_background.controls.clear()
-        for _ in range(30): lines_background.controls.append(ft.Container(height=32, border=ft.border.only(bottom=ft.border.BorderSide(1, c("paper_line"))), width=float("inf")))
-
-        # Reader colors
-        reader_container.bgcolor = bg
-        reader_title.color = fg
-        btn_close_reader.content.color = fg
-
-        # Navbar
-        custom_navbar.bgcolor = c("nav_bg")
-        is_home = dynamic_content.content == cards_column
-        btn_home_container.bgcolor = primary if is_home else c("nav_bg")
-        btn_home_container.content = ft.Row(alignment=ft.MainAxisAlignment.CENTER, controls=[ft.Image(src=FEATHER_MAP["home"], width=20, height=20, color="white" if is_home else fg), ft.Text("HOME", color="white" if is_home else fg, weight="bold")])
+        notes_container = themed(ft.Container(
+            expand=True, padding=20,
+            offset=ft.Offset(1, 0), animate_offset=ft.Animation(400, ft.AnimationCurve.EASE_OUT_CUBIC),
+            opacity=0, animate_opacity=300,
+            content=ft.Column(controls=[
+                ft.Row(alignment=ft.MainAxisAlignment.SPACE_BETWEEN, controls=[
+                    btn_close_notes,
+                    themed(ft.Text("Le tue Note", size=20, weight="bold"), color="text"),
+                    btn_save_notes
+                ]),
+                ft.Divider(color="transparent", height=10),
+                themed(ft.Container(
+                    expand=True, border_radius=5, padding=ft.padding.symmetric(horizontal=15, vertical=10),
+                    shadow=ft.BoxShadow(blur_radius=5, color="#22000000", offset=ft.Offset(2,2)),
+                    content=ft.Column(scroll="auto", controls=[notes_paper])
+                ), bgcolor="paper_bg")
+            ])
+        ), bgcolor="bg")
+        mount(screens_stack, notes_container)
+
+    def build_reader():
+        nonlocal reader_container, reader_title, reader_col, reader_scroll, reader_body, pages_view, text_view, song_header, song_body
+        reader_title = themed(ft.Text("Titolo", size=20, weight="bold"), color="text")
+        reader_col = ft.Column(spacing=10, horizontal_alignment=ft.CrossAxisAlignment.CENTER)
+        reader_scroll = ft.Column(scroll="auto", expand=True, controls=[reader_col], horizontal_alignment=ft.CrossAxisAlignment.CENTER)
+        btn_close_reader = ft.Container(padding=10, on_click=close_reader, content=themed(ft.Image(src=FEATHER_MAP["arrow-left"], width=24, height=24), color="text"))
+
+        # Lista virtualizzata: solo le pagine vicine alla viewport hanno un'immagine,
+        # il resto è sostituito da due spaziatori che mantengono l'altezza totale
+        pages_view = VirtualList(page_slot, PAGE_WINDOW, expand=True, on_scroll_interval=100, on_scroll=on_pages_scroll)
+        # Testi lunghi: una strofa per elemento, montate solo quelle vicine alla viewport
+        text_view = VirtualList(text_slot, TEXT_WINDOW, expand=True, on_scroll_interval=100, on_scroll=on_text_scroll)
+        song_header = ft.Column(spacing=10, horizontal_alignment=ft.CrossAxisAlignment.CENTER)
+        song_body = ft.Column(expand=True, spacing=0, controls=[song_header, text_view.control])
+        reader_body = ft.Container(expand=True, content=reader_scroll)
         
-        is_svg_nav = "user.svg" in img_profile_view.src
-        btn_user_container.bgcolor = primary if not is_home else c("nav_bg")
-        user_icon_color = "white" if not is_home else fg
-        if not is_svg_nav: user_icon_color = None
-        btn_user_container.content = ft.Row(alignment=ft.MainAxisAlignment.CENTER, controls=[ft.Image(src=img_profile_view.src, width=20, height=20, fit="cover", border_radius=50 if not is_svg_nav else 0, color=user_icon_color), ft.Text("PROFILO", color="white" if not is_home else fg, weight="bold")])
-
-        # Cards
-        cards_column.controls.clear()
-        for item in [("Lodi Mattutine", "sunrise"), ("Libretto", "book-open"), ("Inno", "music"), ("Foto ricordo", "camera")]:
-            title, icon = item
-            action = (lambda e, t=title: page.launch_url("https://biografieonline.it/img/bio/gallery/r/Robert_Oppenheimer_1.jpg")) if title == "Foto ricordo" else (lambda e, t=title: open_reader(t))
-            cards_column.controls.append(ft.Container(
-                bgcolor=c("card"), border_radius=22, padding=15, height=80, on_click=action,
-                shadow=ft.BoxShadow(spread_radius=0, blur_radius=15, color="#0D000000", offset=ft.Offset(0, 5)),
-                content=ft.Row(alignment=ft.MainAxisAlignment.SPACE_BETWEEN, controls=[
-                    ft.Row(controls=[
-                        ft.Container(width=50, height=50, bgcolor=c("icon_bg"), border_radius=14, alignment=ft.Alignment(0, 0), content=ft.Image(src=FEATHER_MAP[icon], width=24, height=24, color=primary)),
-                        ft.Container(width=10),
-                        ft.Text(title, size=16, weight="bold", color=fg)
-                    ]),
-                    ft.Image(src=FEATHER_MAP["chevron-right"], width=24, color="#dddddd")
-                ])
-            ))
-        cards_column.controls.append(ft.Container(height=50))
-        page.update()
-
-    def navigate(index):
-        if index == 0: dynamic_content.content = cards_column
-        else: dynamic_content.content = user_view_content
-        update_interface_colors()
+        reader_container = themed(ft.Container(
+            expand=True, padding=0,
+            offset=ft.Offset(1, 0), animate_offset=ft.Animation(400, ft.AnimationCurve.EASE_OUT_CUBIC),
+            opacity=0, animate_opacity=300,
+            content=ft.Column(controls=[
+                ft.Container(padding=20, content=ft.Row(controls=[btn_close_reader, ft.Container(width=10), reader_title])),
+                ft.Divider(height=1, color="#e0e0e0"),
+                reader_body
+            ])
+        ), bgcolor="bg")
+        # Il lettore va sotto le note, come nell'ordine originale dello Stack
+        apply_theme()
+        screens_stack.controls.insert(screens_stack.controls.index(home_column) + 1, reader_container)
+        screens_stack.update()
+
+    def build_zoom():
+        # Visore a tasselli per leggere i dettagli di una pagina (sopra al lettore)
+        nonlocal zoom_container, zoom_title, zoom_viewer
+        zoom_title = themed(ft.Text("", size=16, weight="bold"), color="text")
+        width, height = page.width or 400, (page.height or 800) - 80
+        zoom_viewer = TileViewer(ui_batch.request, width, height, device_pixel_ratio(page), resolve=asset, wrap=perf.handler)
+        btn_close_zoom = ft.Container(padding=10, on_click=close_zoom, content=themed(ft.Image(src=FEATHER_MAP["arrow-left"], width=24, height=24), color="text"))
+        btn_zoom_out = ft.Container(padding=10, on_click=perf.handler("zoom_out", lambda e: zoom_viewer.zoom_by(1 / 1.5, width / 2, height / 2)), content=themed(ft.Text("-", size=22, weight="bold"), color="text"))
+        btn_zoom_in = ft.Container(padding=10, on_click=perf.handler("zoom_in", lambda e: zoom_viewer.zoom_by(1.5, width / 2, height / 2)), content=themed(ft.Text("+", size=22, weight="bold"), color="text"))
+        zoom_container = themed(ft.Container(
+            expand=True, padding=0, visible=False,
+            content=ft.Column(spacing=0, controls=[
+                ft.Container(padding=ft.padding.symmetric(horizontal=10, vertical=8), content=ft.Row(alignment=ft.MainAxisAlignment.SPACE_BETWEEN, controls=[
+                    ft.Row([btn_close_zoom, zoom_title]), ft.Row([btn_zoom_out, btn_zoom_in])
+                ])),
+                zoom_viewer.control
+            ])
+        ), bgcolor="bg")
+        mount(screens_stack, zoom_container)
+
+    def build_search():
+        # Ricerca su titoli, testi dei canti e note (sopra a tutto, come le note)
+        nonlocal search_container, search_input, search_results
+        search_input = themed(ft.TextField(hint_text="Cerca titoli, canti e note", autofocus=True, on_change=perf.handler("search_change", lambda e: search_runner()),
+                                           border=ft.InputBorder.NONE, text_size=16), color="text")
+        search_results = ft.Column(scroll="auto", expand=True, spacing=10)
+        btn_close_search = ft.Container(padding=10, on_click=close_search, content=themed(ft.Image(src=FEATHER_MAP["arrow-left"], width=24, height=24), color="text"))
+        search_container = themed(ft.Container(
+            expand=True, padding=20,
+            offset=ft.Offset(1, 0), animate_offset=ft.Animation(400, ft.AnimationCurve.EASE_OUT_CUBIC),
+            opacity=0, animate_opacity=300,
+            content=ft.Column(controls=[
+                ft.Row(controls=[btn_close_search, themed(ft.Container(expand=True, border_radius=12, padding=ft.padding.symmetric(horizontal=10), content=search_input), bgcolor="input_bg")]),
+                ft.Divider(color="transparent", height=10),
+                search_results
+            ])
+        ), bgcolor="bg")
+        mount(screens_stack, search_container)
 
-    def open_reader(title):
-        reader_title.value = title
+    # --- LOGICA ---
+    def update_interface_colors(*changed):
+        # Invia solo i controlli toccati; la pagina stessa solo se cambia il suo sfondo
+        dirty = changed + tuple(apply_theme())
+        if page in dirty: page.update()
+        elif dirty: page.update(*dirty)
+
+    @perf.timed("navigate")
+    async def navigate(index, e=None):
+        prefetcher.touch()
+        if index != 0 and user_view_content is None: build_user_view()
+        cards_column.visible = index == 0
+        user_view_content.visible = index != 0 if user_view_content else False
+        update_interface_colors(*[c for c in (cards_column, user_view_content) if c])
+        # Le scritture in sospeso partono dopo il cambio di scheda, senza fermare il loop
+        await offload(flush_pending)
+
+    def page_slot_height(img):
+        entry = pages_manifest.get(img)
+        ratio = entry["height"] / entry["width"] if entry else 1.414
+        return round(PAGE_DISPLAY_WIDTH * ratio) + PAGE_GAP
+
+    def page_slot(i, img, height):
+        # Con la piramide di tasselli generata, un tocco apre lo zoom della pagina
+        zoomable = "tiles" in pages_manifest.get(img, {})
+        return ft.Container(height=height, alignment=ft.alignment.top_center, on_click=(lambda e: open_zoom(img, i + 1)) if zoomable else None,
+                            content=ft.Image(src=page_src(img), width=PAGE_DISPLAY_WIDTH, border_radius=5))
+
+    @perf.timed("on_pages_scroll")
+    def on_pages_scroll(e):
+        prefetcher.touch()
+        if pages_view.scroll(e.pixels, e.viewport_dimension): pages_view.control.update()
+
+    def text_width():
+        return min(page.width or 400, 400) - 2 * TEXT_PADDING
+
+    def text_slot(i, chunk, height):
+        return ft.Container(padding=ft.padding.symmetric(horizontal=TEXT_PADDING, vertical=TEXT_GAP / 2),
+                            content=ft.Text(chunk, size=state["font_size"], color=get_c("text"), text_align="center"))
+
+    def text_heights(chunks):
+        size, width = state["font_size"], text_width()
+        return [text_height(chunk, size, width, TEXT_GAP) for chunk in chunks]
+
+    @perf.timed("on_text_scroll")
+    def on_text_scroll(e):
+        prefetcher.touch()
+        if text_view.scroll(e.pixels, e.viewport_dimension): text_view.control.update()
+
+    def reflow_text():
+        # Cambio del corpo: si aggiornano solo le strofe montate e gli spaziatori
+        for slot in text_view.visible(): slot.content.size = state["font_size"]
+        text_view.resize(text_heights(text_view.items))
+        ui_batch.request(text_view.control)
+
+    @perf.timed("open_reader")
+    async def open_reader(item_id):
+        # Un'apertura più recente o il ritorno indietro annullano questa
+        reader_work.claim()
+        prefetcher.touch()
+        item = CATALOG.get(item_id)
+        if reader_container is None: build_reader()
+        reader_title.value = item["title"]
         reader_col.controls.clear()
+        reader_body.content = reader_scroll
         c = get_c
-        reader_container.bgcolor = c("bg")
-        reader_title.color = c("text")
-        btn_close_reader.content.color = c("text")
-        if title == "Inno":
-            text_el = ft.Container(padding=20, content=ft.Text(LYRICS_TEXT, size=state["font_size"], color=c("text"), text_align="center"))
-            
+        audio_ui.clear()
+        # La lista si riporta in cima solo se era stata scorsa
+        scrolled = pages_view.pixels > 0 or text_view.pixels > 0
+        if not CATALOG.cached(item):
+            # Contenuto ancora da leggere: il lettore entra subito con il titolo, il resto dopo
+            reader_col.controls.append(ft.Container(padding=20, content=ft.Text("Caricamento...", color=c("text_sub"))))
+            show_reader()
+            await offload(CATALOG.text if item["kind"] == "song" else CATALOG.pages, item)
+            reader_col.controls.clear()
+        if item["kind"] == "song":
             icon_play = ft.Image(src=FEATHER_MAP["play"], width=30, height=30, color="white")
             label_play = ft.Text("RIPRODUCI", color="white", weight="bold")
             btn_play = ft.Container(bgcolor=c("primary"), border_radius=15, padding=15, width=250, content=ft.Row([icon_play, label_play], alignment=ft.MainAxisAlignment.CENTER))
             btn_stop = ft.Container(padding=10, content=ft.Column([ft.Image(src=FEATHER_MAP["stop"], width=24, height=24, color="red"), ft.Text("STOP", size=10, color="red")], spacing=2, alignment=ft.MainAxisAlignment.CENTER))
-            
-            def toggle_audio(e):
-                if state["audio_playing"]:
-                    if audio_player: audio_player.pause()
-                    state["audio_playing"] = False
-                    icon_play.src = FEATHER_MAP["play"]
-                    label_play.value = "RIPRENDI"
-                    btn_play.bgcolor = c("primary")
-                else:
-                    if audio_player: audio_player.play()
-                    state["audio_playing"] = True
-                    icon_play.src = FEATHER_MAP["pause"]
-                    label_play.value = "PAUSA"
-                    btn_play.bgcolor = "#d9534f"
-                btn_play.update()
-            
-            def stop_audio(e):
-                if audio_player:
-                    audio_player.pause()
-                    audio_player.seek(0)
-                state["audio_playing"] = False
-                icon_play.src = FEATHER_MAP["play"]
-                label_play.value = "RIPRODUCI"
-                btn_play.bgcolor = c("primary")
-                btn_play.update()
-            
-            btn_play.on_click = toggle_audio
-            btn_stop.on_click = stop_audio
-            reader_col.controls.extend([ft.Container(height=20), ft.Row([btn_play, btn_stop], alignment=ft.MainAxisAlignment.CENTER), ft.Container(height=10), text_el, ft.Container(height=50)])
+            lbl_audio = ft.Text("", size=12, color=c("text_sub"))
+            btn_play.on_click = perf.handler("toggle_audio", lambda e: song_audio.toggle())
+            btn_stop.on_click = perf.handler("stop_audio", lambda e: song_audio.stop())
+            if item.get("audio"):
+                audio_ui.update(icon=icon_play, label=label_play, button=btn_play, status=lbl_audio)
+                render_audio_status(song_audio.status)
+            song_header.controls = [ft.Container(height=20), ft.Row([btn_play, btn_stop], alignment=ft.MainAxisAlignment.CENTER), lbl_audio] if item.get("audio") else []
+            chunks = text_chunks(CATALOG.text(item))
+            text_view.set_items(chunks, text_heights(chunks), page.height or 800)
+            reader_body.content = song_body
         else:
-            if not BOOKS_DATA[title]: reader_col.controls.append(ft.Container(padding=20, content=ft.Text("Nessuna pagina qui.", color=c("text_sub"))))
+            pages = CATALOG.pages(item)
+            if not pages: reader_col.controls.append(ft.Container(padding=20, content=ft.Text("Nessuna pagina qui.", color=c("text_sub"))))
             else:
-                for img in BOOKS_DATA[title]: reader_col.controls.append(ft.Image(src=img, width=350, border_radius=5)); reader_col.controls.append(ft.Container(height=10))
+                pages_view.set_items(pages, [page_slot_height(img) for img in pages], page.height or 800)
+                reader_body.content = pages_view.control
+        show_reader()
+        if scrolled and reader_body.content in (pages_view.control, song_body):
+            (pages_view if reader_body.content is pages_view.control else text_view).control.scroll_to(offset=0, duration=0)
+        # Primo tocco senza hover (mobile): il caricamento parte mentre la schermata entra
+        if item.get("audio"): song_audio.preload(asset(item["audio"]))
+
+    def show_reader():
         reader_container.offset = ft.Offset(0, 0)
         reader_container.opacity = 1
         reader_container.update()
 
-    def close_reader(e):
-        if state["audio_playing"]: 
-            if audio_player: audio_player.pause()
-            state["audio_playing"] = False
+    def show_chunk(chunk):
+        # Porta la strofa trovata in cima al lettore
+        text_view.scroll(text_view.offsets[chunk], text_view.viewport)
+        text_view.control.update()
+        text_view.control.scroll_to(offset=text_view.offsets[chunk], duration=300)
+
+    # Stato del player -> (icona, etichetta, colore del pulsante, riga di stato)
+    AUDIO_STATUS_UI = {
+        audio.IDLE: ("play", "RIPRODUCI", "primary", ""),
+        audio.LOADING: ("play", "RIPRODUCI", "primary", "Caricamento audio..."),
+        audio.BUFFERING: ("pause", "CARICAMENTO...", "primary", "Caricamento audio..."),
+        audio.READY: ("play", "RIPRODUCI", "primary", "Pronto"),
+        audio.PLAYING: ("pause", "PAUSA", "#d9534f", ""),
+        audio.PAUSED: ("play", "RIPRENDI", "primary", ""),
+        audio.ERROR: ("play", "RIPRODUCI", "primary", "Audio non disponibile"),
+    }
+
+    def render_audio_status(status):
+        icon, label, color, line = AUDIO_STATUS_UI[status]
+        audio_ui["icon"].src = FEATHER_MAP[icon]
+        audio_ui["label"].value = label
+        audio_ui["button"].bgcolor = get_c(color) if color in COLORS["light"] else color
+        audio_ui["status"].value = line
+
+    @perf.timed("audio_status")
+    def show_audio_status(status):
+        # Chiamato anche dal thread degli eventi del player: aggiorna solo i controlli del pulsante
+        if not audio_ui: return
+        render_audio_status(status)
+        try: page.update(audio_ui["button"], audio_ui["status"])
+        except: pass
+
+    @perf.timed("close_reader")
+    async def close_reader(e):
+        reader_work.cancel()
+        audio_ui.clear()
+        song_audio.release()
         reader_container.offset = ft.Offset(1, 0)
         reader_container.opacity = 0
         reader_container.update()
 
-    def open_notes(e):
-        notes_container.bgcolor = get_c("bg")
-        lines_background.controls.clear()
-        for _ in range(30): lines_background.controls.append(ft.Container(height=32, border=ft.border.only(bottom=ft.border.BorderSide(1, get_c("paper_line"))), width=float("inf")))
-        notes_container.content.controls[2].bgcolor = get_c("paper_bg")
-        notes_input_full.color = get_c("text")
+    @perf.timed("open_zoom")
+    def open_zoom(img, number):
+        prefetcher.touch()
+        if zoom_container is None: build_zoom()
+        zoom_title.value = f"{reader_title.value} - pagina {number}"
+        zoom_container.visible = True
+        zoom_viewer.open(img, pages_manifest[img])
+        zoom_container.update()
+
+    @perf.timed("close_zoom")
+    def close_zoom(e):
+        zoom_viewer.close()
+        zoom_container.visible = False
+        zoom_container.update()
+
+    @perf.timed("open_notes")
+    async def open_notes(e):
+        prefetcher.touch()
+        if notes_container is None: build_notes()
         notes_container.offset = ft.Offset(0, 0)
         notes_container.opacity = 1
         notes_container.update()
-
-    def close_notes(e):
+        if notes_input_full.read_only:
+            # Journal non ancora letto: la schermata entra subito, il testo appena arriva
+            text = await offload(load_notes)
+            if text is None:
+                notes_input_full.hint_text = "Impossibile leggere le note: riapri per riprovare."
+                notes_input_full.update()
+            elif notes_input_full.read_only:
+                notes_input_full.value = text
+                notes_input_full.read_only = False
+                notes_input_full.hint_text = None
+                notes_input_full.update()
+
+    @perf.timed("close_notes")
+    async def close_notes(e):
         notes_container.offset = ft.Offset(1, 0)
         notes_container.opacity = 0
         notes_container.update()
-        page.client_storage.set("user_notes", notes_input_full.value)
-
-    def save_notes(e):
-        page.client_storage.set("user_notes", notes_input_full.value)
-        btn_save_notes.content.color = "green"
-        btn_save_notes.update()
+        notes_writer()
+        await offload(flush_pending)
+
+    @perf.timed("on_notes_change")
+    def on_notes_change(e):
+        notes_writer()
+        if state["notes_saved"]:
+            state["notes_saved"] = False
+            ui_batch.request(*apply_theme())
+        # L'indice della ricerca segue le note riga per riga (solo se la ricerca è già stata aperta)
+        if notes_search: notes_search.update(e.control.value or "")
+
+    @perf.timed("save_notes")
+    async def save_notes(e):
+        if notes_journal is None: return
+        notes_writer()
+        await offload(notes_writer.flush)
+        # Il colore passa dal binding del tema: apply_theme() resta l'unico a toccarlo
+        state["notes_saved"] = True
+        update_interface_colors()
 
+    @perf.timed("open_search")
+    async def open_search(e):
+        nonlocal notes_search
+        prefetcher.touch()
+        if search_container is None: build_search()
+        search_container.offset = ft.Offset(0, 0)
+        search_container.opacity = 1
+        search_container.update()
+        if notes_search is None:
+            # Le note entrano nell'indice appena lette; fino ad allora si cerca nel catalogo
+            text = await offload(current_notes)
+            if notes_search is None and text is not None:
+                notes_search = search.LinesIndex(search.SearchIndex())
+                notes_search.update(text)
+
+    @perf.timed("close_search")
+    def close_search(e):
+        search_container.offset = ft.Offset(1, 0)
+        search_container.opacity = 0
+        search_container.update()
+
+    def search_hit(hit):
+        c = get_c
+        item = CATALOG.get(hit["item"]) if "item" in hit else None
+        async def action(e):
+            close_search(e)
+            if hit["kind"] == "notes": return await open_notes(e)
+            # Come dalla home: le card "link" aprono l'indirizzo, le altre il lettore
+            if item["kind"] == "link": return page.launch_url(item["url"])
+            await open_reader(item["id"])
+            if hit["kind"] == "song": show_chunk(hit["chunk"])
+        title = "Le tue Note" if hit["kind"] == "notes" else hit["title"]
+        icon = "edit" if hit["kind"] == "notes" else "music" if hit["kind"] == "song" else item["icon"] if item.get("icon") in FEATHER_MAP else "book-open"
+        return ft.Container(bgcolor=c("card"), border_radius=14, padding=12, on_click=action, content=ft.Row(controls=[
+            ft.Image(src=FEATHER_MAP[icon], width=20, height=20, color=c("primary")),
+            ft.Column(spacing=2, expand=True, controls=[
+                ft.Text(title, size=14, weight="bold", color=c("text")),
+                ft.Text(hit["snippet"], size=12, color=c("text_sub"), max_lines=1, overflow=ft.TextOverflow.ELLIPSIS)
+            ] if hit["kind"] != "title" else [ft.Text(title, size=14, weight="bold", color=c("text"))])
+        ]))
+
+    def run_search():
+        # Dopo l'ultimo tasto: catalogo (condiviso fra le sessioni) e note di questa sessione
+        query = search_input.value or ""
+        indexes = [search.catalog_index(CATALOG)] + ([notes_search.index] if notes_search else [])
+        hits = search.search(query, *indexes)
+        if hits: search_results.controls = [search_hit(hit) for hit in hits]
+        elif search.tokens(query): search_results.controls = [ft.Text("Nessun risultato.", color=get_c("text_sub"))]
+        else: search_results.controls = []
+        # Già accorpata dal debounce: un solo invio per ricerca
+        search_results.update()
+
+    search_runner = Debouncer(perf.handler("search", run_search), delay=SEARCH_DELAY)
+
+    @perf.timed("on_name_change")
     def on_name_change(e):
+        prefetcher.touch()
         txt_welcome_name.value = f"Bentornato, {e.control.value}"
-        page.client_storage.set("user_name", e.control.value)
-        txt_welcome_name.update()
+        store(name=e.control.value)
+        ui_batch.request(txt_welcome_name)
 
+    @perf.timed("on_font_change")
     def on_font_change(e):
+        prefetcher.touch()
+        # Durante il trascinamento si aggiorna solo l'etichetta, al massimo una volta per frame
+        lbl_font_size.value = f"Grandezza Testo: {int(e.control.value)}"
+        ui_batch.request(lbl_font_size)
+
+    @perf.timed("on_font_change_end")
+    def on_font_change_end(e):
         new_size = e.control.value
         state["font_size"] = new_size
-        notes_input_full.text_size = new_size
         lbl_font_size.value = f"Grandezza Testo: {int(new_size)}"
-        page.client_storage.set("font_size", new_size)
-        lbl_font_size.update()
-        notes_input_full.update()
-
+        store(font=new_size)
+        ui_batch.request(lbl_font_size)
+        if notes_input_full:
+            notes_input_full.text_size = new_size
+            notes_input_full.text_style = paper.text_style(new_size)
+            # Lo sfondo a righe dipende anche dal corpo: apply_theme() rifà solo quello
+            ui_batch.request(notes_input_full, *apply_theme())
+        if text_view and reader_body.content is song_body: reflow_text()
+
+    @perf.timed("on_theme_change")
     def on_theme_change(e):
+        prefetcher.touch()
         state["is_dark"] = e.control.value
-        page.client_storage.set("dark_mode", state["is_dark"])
+        store(dark=state["is_dark"])
         update_interface_colors()
 
+    # --- PREFETCH ---
+    # Con la home a schermo e l'utente fermo si prepara il lettore fuori schermo, si
+    # leggono elenchi e testi del catalogo e il client scarica le prime pagine di ogni
+    # libretto nel livello invisibile: aprendolo, la prima pagina è già in cache.
+    prefetcher = IdlePrefetcher(PREFETCH_BUDGET, PREFETCH_MEMORY)
+
+    def warm_page(book, n):
+        pages = CATALOG.pages(book)
+        if n < len(pages):
+            warm_layer.controls.append(ft.Image(src=page_src(pages[n]), width=1, height=1))
+            warm_layer.update()
+
+    def warm_cost(book, n):
+        pages = CATALOG.pages(book)
+        return page_cost(pages[n]) if n < len(pages) else (0, 0)
+
+    async def prepare_reader():
+        # Sul loop della sessione, come open_reader: le due costruzioni non si sovrappongono mai
+        if reader_container is None: build_reader()
+
+    def schedule_prefetch():
+        # Il prefetcher gira in un suo thread: ciò che costruisce controlli va passato al loop
+        prefetcher.add(lambda: page.run_task(prepare_reader))
+        for n in range(PREFETCH_PAGES):
+            for book in CATALOG.books():
+                prefetcher.add(lambda b=book, n=n: warm_page(b, n), cost=lambda b=book, n=n: warm_cost(b, n), priority=1 + 2 * n)
+        for item in CATALOG.items():
+            if item["kind"] == "song": prefetcher.add(lambda i=item: CATALOG.text(i), priority=2)
+        prefetcher.add(load_notes, priority=3)
+        prefetcher.add(lambda: search.catalog_index(CATALOG), priority=3)
+        prefetcher.start()
+
     # Bindings
-    txt_name_input.on_change = on_name_change
-    slider_font.on_change = on_font_change
-    switch_theme.on_change = on_theme_change
-    btn_open_notes_user.on_click = open_notes
-    btn_close_notes.on_click = close_notes
-    btn_save_notes.on_click = save_notes
-    btn_close_reader.on_click = close_reader
-    btn_home_container.on_click = lambda e: navigate(0)
-    btn_user_container.on_click = lambda e: navigate(1)
+    btn_home_container.on_click = partial(navigate, 0)
+    btn_user_container.on_click = partial(navigate, 1)
+    btn_search.on_click = open_search
+
+    # Schermata di debug nascosta (solo con M2G_PERF=1): pressione lunga sul logo
+    def show_debug(e):
+        def dump_stats(e):
+            try: dlg.title = ft.Text(f"Salvato in {perf.dump()}", size=12)
+            except Exception as ex: dlg.title = ft.Text(f"Errore: {ex}", size=12)
+            dlg.update()
+        lines = [f"startup {' '.join(f'{k}={v:.1f}' for k, v in perf.last_startup.items())}"]
+        for name, h in perf.summary().items():
+            lines.append(f"{name}: n={h['count']} p50={h.get('p50_ms')} p90={h.get('p90_ms')} p99={h.get('p99_ms')}ms upd={h.get('updates_avg')} bytes={h.get('bytes_avg')}/{h.get('bytes_max')}")
+        dlg = ft.AlertDialog(
+            title=ft.Text("Prestazioni", size=16),
+            content=ft.Column(scroll="auto", height=400, controls=[ft.Text(l, size=11, font_family="monospace", selectable=True) for l in lines]),
+            actions=[ft.TextButton("SALVA", on_click=dump_stats), ft.TextButton("CHIUDI", on_click=lambda e: page.close(dlg))]
+        )
+        page.open(dlg)
+
+    if perf.ENABLED:
+        perf.watch_connection(page.connection)
+        header_logo.on_long_press = show_debug
+
+    # Ultimo salvataggio quando l'app perde il fuoco o va in background (anche la scheda web
+    # che si chiude passa da qui): va fatto finché il client è connesso, perché dopo
+    # on_disconnect / on_close client_storage non risponde più e le scritture andrebbero perse.
+    @perf.timed("on_lifecycle")
+    def on_lifecycle(e):
+        if e.state == ft.AppLifecycleState.RESUME: prefetcher.start()
+        if e.state == ft.AppLifecycleState.INACTIVE: flush_pending()
+        if e.state in (ft.AppLifecycleState.HIDE, ft.AppLifecycleState.PAUSE, ft.AppLifecycleState.DETACH):
+            prefetcher.pause()
+            flush_pending()
+            try:
+                if notes_journal: notes_journal.compact()
+            except: pass
+    page.on_app_lifecycle_state_change = on_lifecycle
+    # Una sessione web può riconnettersi: alla disconnessione il prefetch si sospende soltanto
+    page.on_disconnect = perf.handler("on_disconnect", lambda e: prefetcher.pause())
+    page.on_connect = perf.handler("on_connect", lambda e: prefetcher.start())
+    page.on_close = perf.handler("on_close", lambda e: prefetcher.stop())
 
     # Start
     mobile_screen = ft.Container(
         expand=True, 
         bgcolor="white", 
-        content=ft.Stack(controls=[
-            ft.Column(alignment=ft.MainAxisAlignment.SPACE_BETWEEN, controls=[header_container, dynamic_content, custom_navbar]),
-            reader_container,
-            notes_container
-        ])
+        content=screens_stack
     )
     
+    apply_theme()
+    startup.mark("theme")
     page.add(mobile_screen)
-    update_interface_colors()
+    startup.mark("first_update")
+    startup.done()
+    schedule_prefetch()
 
-# IMPORTANTE: assets_dir="assets" (senza slash)
+# IMPORTANTE: assets_dir senza slash ("assets" con il bundle, altrimenti "assets_src")
 if __name__ == "__main__":
-    ft.app(target=main, assets_dir="assets")
+    logging.basicConfig(level=logging.WARNING)
+    logging.getLogger("m2g").setLevel(logging.INFO)
+    ft.app(target=main, assets_dir=os.path.basename(ASSETS_DIR))
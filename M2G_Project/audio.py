@@ -0,0 +1,131 @@
+import threading
+
+import flet as ft
+
+# --- AUDIO ---
+# Il player di un canto non esiste finché l'utente non si avvicina alla card: preload()
+# crea ft.Audio e ne avvia il caricamento (hover o primo tocco), così alla pressione
+# di play il file è già in arrivo. release() lo toglie dall'overlay alla chiusura.
+# Un solo player alla volta: il preload di un altro file rilascia il precedente.
+IDLE = "idle"            # nessun player
+LOADING = "loading"      # caricamento avviato
+BUFFERING = "buffering"  # play richiesto, si parte appena arriva on_loaded
+READY = "ready"
+PLAYING = "playing"
+PAUSED = "paused"
+ERROR = "error"          # on_loaded non è mai arrivato
+
+LOAD_TIMEOUT = 15
+
+class AudioManager:
+    def __init__(self, page, src=None, on_status=None):
+        self.page = page
+        self.src = src
+        self.on_status = on_status
+        self.player = None
+        self.status = IDLE
+        self.loaded = False
+        self._want_play = False
+        self._timer = None
+        self._lock = threading.Lock()
+
+    def _set(self, status):
+        if status == self.status: return
+        self.status = status
+        if self.on_status:
+            try: self.on_status(status)
+            except: pass
+
+    def preload(self, src=None):
+        if src and src != self.src:
+            self.release()
+            self.src = src
+        with self._lock:
+            if self.player is not None: return
+            self.player = ft.Audio(src=self.src, autoplay=False, release_mode="stop",
+                                   on_loaded=self._on_loaded, on_state_changed=self._on_state_changed)
+            self._timer = threading.Timer(LOAD_TIMEOUT, self._on_timeout)
+            self._timer.daemon = True
+        try:
+            self.page.overlay.append(self.player)
+            self.page.update()
+        except:
+            self.release()
+            self._set(ERROR)
+            return
+        self._timer.start()
+        self._set(LOADING)
+
+    def play(self):
+        if self.status == PLAYING: return
+        # Caricamento scaduto: il vecchio player non caricherà più, se ne crea uno nuovo
+        if self.status == ERROR: self.release()
+        if self.status == PAUSED:
+            self.player.resume()
+        elif self.loaded:
+            self.player.play()
+        else:
+            self.preload()
+            if self.status == ERROR: return
+            self._want_play = True
+            self._set(BUFFERING)
+            return
+        self._set(PLAYING)
+
+    def pause(self):
+        if self.status == BUFFERING:
+            self._want_play = False
+            self._set(LOADING)
+        elif self.status == PLAYING:
+            self.player.pause()
+            self._set(PAUSED)
+
+    def stop(self):
+        self._want_play = False
+        if self.status in (PLAYING, PAUSED):
+            self.player.pause()
+            self.player.seek(0)
+        if self.status != IDLE and self.status != ERROR:
+            self._set(READY if self.loaded else LOADING)
+
+    def toggle(self):
+        if self.status in (PLAYING, BUFFERING): self.pause()
+        else: self.play()
+
+    def release(self):
+        with self._lock:
+            player, self.player = self.player, None
+            if self._timer: self._timer.cancel()
+            self._timer = None
+        self.loaded = False
+        self._want_play = False
+        if player is not None:
+            try:
+                player.release()
+                self.page.overlay.remove(player)
+                self.page.update()
+            except: pass
+        self._set(IDLE)
+
+    # Eventi del client (arrivano dal thread degli eventi)
+    def _on_loaded(self, e):
+        if e.control is not self.player: return
+        if self._timer: self._timer.cancel()
+        self.loaded = True
+        if self._want_play:
+            self._want_play = False
+            self.player.play()
+            self._set(PLAYING)
+        elif self.status in (LOADING, ERROR):
+            self._set(READY)
+
+    def _on_state_changed(self, e):
+        if e.control is not self.player: return
+        if e.state == ft.AudioState.PLAYING: self._set(PLAYING)
+        elif e.state == ft.AudioState.PAUSED: self._set(PAUSED)
+        elif e.state in (ft.AudioState.STOPPED, ft.AudioState.COMPLETED): self._set(READY)
+
+    def _on_timeout(self):
+        if not self.loaded and self.player is not None:
+            self._want_play = False
+            self._set(ERROR)
@@ -0,0 +1,48 @@
+import os
+import uuid
+
+# --- AVATAR ---
+# La foto scelta dalla galleria non viene mai mostrata direttamente: si ritaglia
+# al centro e si riduce una volta sola a due miniature fisse, salvate nella cartella
+# dati dell'app. In client_storage finisce solo il nome del file, mai il percorso.
+AVATAR_SIZES = {"profile": 450, "nav": 64}  # 150 px e 20 px a densità 3x
+AVATAR_PREFIX = "avatar_"
+AVATAR_QUALITY = 85
+
+def avatar_dir():
+    path = os.path.join(os.environ.get("FLET_APP_STORAGE_DATA") or os.path.join(os.path.expanduser("~"), ".m2g"), "avatar")
+    os.makedirs(path, exist_ok=True)
+    return path
+
+def avatar_path(name):
+    return os.path.join(avatar_dir(), name)
+
+def make_avatars(src_path):
+    # Lavoro pesante (decodifica di una foto da 12 MP): va chiamato fuori dal thread degli eventi
+    from PIL import Image, ImageOps
+
+    token = uuid.uuid4().hex[:12]
+    names = {}
+    with Image.open(src_path) as im:
+        # Con i JPEG il decoder può già scalare di 1/2, 1/4, 1/8: molta meno memoria
+        biggest = max(AVATAR_SIZES.values())
+        im.draft("RGB", (biggest, biggest))
+        im = ImageOps.exif_transpose(im).convert("RGB")
+        side = min(im.size)
+        left, top = (im.width - side) // 2, (im.height - side) // 2
+        im = im.crop((left, top, left + side, top + side))
+        for kind, size in sorted(AVATAR_SIZES.items(), key=lambda kv: -kv[1]):
+            im = im.resize((min(size, side), min(size, side)), Image.LANCZOS)
+            name = f"{AVATAR_PREFIX}{token}_{size}.jpg"
+            im.save(avatar_path(name), "JPEG", quality=AVATAR_QUALITY, optimize=True)
+            names[kind] = name
+    return names
+
+def remove_avatars(keep=()):
+    # Cancella le miniature delle foto precedenti
+    keep = set(keep)
+    folder = avatar_dir()
+    for name in os.listdir(folder):
+        if name.startswith(AVATAR_PREFIX) and name not in keep:
+            try: os.remove(os.path.join(folder, name))
+            except OSError: pass
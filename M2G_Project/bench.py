@@ -0,0 +1,433 @@
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import sys
+import threading
+import time
+
+import flet as ft
+from flet.core.local_connection import LocalConnection
+from flet.core.protocol import ClientActions, ClientMessage, CommandEncoder, PageCommandResponsePayload, PageCommandsBatchResponsePayload
+
+import app
+import scheduler
+import search
+import settings
+from notes_store import NotesJournal
+from virtual_list import text_chunks
+
+# Il prefetch a riposo partirebbe a caso durante gli scenari lunghi: si esegue solo con drain_all()
+scheduler.IDLE_PREFETCH = False
+
+# --- BENCHMARK ---
+# Esegue main(page) su una Page locale senza client Flet: la connessione registra
+# ogni messaggio che verrebbe inviato (update, controlli, byte serializzati) e
+# client_storage è un dizionario in memoria con latenza configurabile.
+#
+#   python bench.py                       # tabella
+#   python bench.py --json base.json      # salva i risultati
+#   python bench.py --baseline base.json  # confronta; esce con 1 se update/byte peggiorano
+#   python bench.py --search-scale 200    # solo l'indice di ricerca, su un corpus sintetico
+
+class RecordingConnection(LocalConnection):
+    def __init__(self):
+        super().__init__()
+        self.updates = 0
+        self.controls = 0
+        self.bytes = 0
+        self.sent_at = []
+        self.sent = []
+
+    def _record(self, message):
+        self.sent_at.append(time.perf_counter())
+        self.updates += 1
+        self.controls += count_controls(message)
+        self.sent.append(json.dumps(message, cls=CommandEncoder, separators=(",", ":")))
+        self.bytes += len(self.sent[-1])
+
+    def send_command(self, session_id, command):
+        result, message = self._process_command(command)
+        if message: self._record(message)
+        return PageCommandResponsePayload(result=result, error="")
+
+    def send_commands(self, session_id, commands):
+        results, messages = [], []
+        for command in commands:
+            result, message = self._process_command(command)
+            if command.name in ("add", "get"): results.append(result)
+            if message: messages.append(message)
+        if messages: self._record(ClientMessage(ClientActions.PAGE_CONTROLS_BATCH, messages))
+        return PageCommandsBatchResponsePayload(results=results, error="")
+
+def count_controls(message):
+    if message.action == ClientActions.PAGE_CONTROLS_BATCH: return sum(count_controls(m) for m in message.payload)
+    payload = message.payload
+    for attr in ("controls", "props", "ids"):
+        if hasattr(payload, attr): return len(getattr(payload, attr))
+    return 0
+
+
+class MemoryStorage:
+    def __init__(self, values=None, delay=0.0):
+        self.values = dict(values or {})
+        self.delay = delay
+        self.reads = 0
+        self.writes = 0
+
+    def get(self, key):
+        self.reads += 1
+        if self.delay: time.sleep(self.delay)
+        return self.values.get(key)
+
+    def set(self, key, value):
+        self.writes += 1
+        if self.delay: time.sleep(self.delay)
+        self.values[key] = json.loads(json.dumps(value))
+        return True
+
+    def contains_key(self, key): return key in self.values
+
+    def remove(self, key):
+        self.values.pop(key, None)
+        return True
+
+    def get_keys(self, key_prefix):
+        self.reads += 1
+        return [k for k in self.values if k.startswith(key_prefix)]
+
+
+class BenchPage(ft.Page):
+    def __init__(self, storage=None, width=400, height=800):
+        self.conn = RecordingConnection()
+        self.storage = storage if storage is not None else MemoryStorage()
+        self.launched = []
+        self.latencies = []
+        # Il loop della sessione gira in un thread, come nel server di Flet: lì vanno gli handler async
+        loop = asyncio.new_event_loop()
+        threading.Thread(target=loop.run_forever, daemon=True).start()
+        super().__init__(self.conn, "bench", loop)
+        self._set_attr("width", width, dirty=False)
+        self._set_attr("height", height, dirty=False)
+
+    @property
+    def client_storage(self):
+        return self.storage
+
+    def launch_url(self, url, *args, **kwargs):
+        self.launched.append(url)
+
+    def counters(self):
+        return {"updates": self.conn.updates, "controls": self.conn.controls, "bytes": self.conn.bytes,
+                "storage_reads": self.storage.reads, "storage_writes": self.storage.writes}
+
+# --- PILOTAGGIO ---
+# Gli handler sono chiusure dentro main(): si trovano i controlli nell'albero e si
+# chiamano i loro handler come farebbe il client.
+def walk(control):
+    yield control
+    for child in control._get_children(): yield from walk(child)
+
+def find(page, pred):
+    for c in walk(page):
+        if pred(c): return c
+    raise LookupError("controllo non trovato")
+
+def find_text_button(page, label):
+    # Il contenitore cliccabile più vicino che contiene il testo
+    def has_label(c):
+        return c.on_click and any(isinstance(t, ft.Text) and t.value == label for t in walk(c))
+    return [c for c in walk(page) if isinstance(c, ft.Container) and has_label(c)][-1]
+
+def fire(control, name="click", handler=None, data=""):
+    dispatch((control, name, handler, data))
+
+def dispatch(*events):
+    # Eventi arrivati insieme: gli handler async partono sul loop nello stesso giro
+    # (come task separati, nell'ordine), quelli sincroni si eseguono qui. Si aspetta
+    # che finiscano tutti; la latenza è il tempo fino al primo messaggio verso il client.
+    page = events[0][0].page
+    t0 = time.perf_counter()
+    calls = []
+    for control, name, handler, data in events:
+        handler = handler or getattr(control, f"on_{name}")
+        calls.append((handler, ft.ControlEvent(control.uid, name, data, control, page)))
+    coros = [(h, e) for h, e in calls if asyncio.iscoroutinefunction(h)]
+    if coros:
+        async def run():
+            tasks = [asyncio.create_task(h(e)) for h, e in coros]
+            await asyncio.gather(*tasks, return_exceptions=True)
+        asyncio.run_coroutine_threadsafe(run(), page.loop).result()
+    for h, e in calls:
+        if not asyncio.iscoroutinefunction(h): h(e)
+    sent = [t for t in page.conn.sent_at if t >= t0]
+    if sent: page.latencies.append((sent[0] - t0) * 1000)
+
+def settle():
+    scheduler.flush_all()
+
+def prefetch(page):
+    scheduler.drain_all()
+    # I compiti passati al loop della sessione (page.run_task) finiscono prima di questo
+    asyncio.run_coroutine_threadsafe(asyncio.sleep(0), page.loop).result()
+
+def navigate(page, index):
+    fire(find_text_button(page, "HOME" if index == 0 else "PROFILO"))
+
+def open_reader(page, title):
+    fire(find_text_button(page, title))
+
+def toggle_theme(page):
+    switch = find(page, lambda c: isinstance(c, ft.Switch))
+    switch.value = not switch.value
+    fire(switch, "change")
+
+# Gli eventi arrivano al ritmo di un utente vero, altrimenti il batching per frame li fonde tutti
+DRAG_INTERVAL = 1 / 60
+KEY_INTERVAL = 0.08
+
+def drag_font(page, steps=40):
+    slider = find(page, lambda c: isinstance(c, ft.Slider))
+    for i in range(steps):
+        slider.value = 12 + (30 - 12) * i / (steps - 1)
+        fire(slider, "change")
+        time.sleep(DRAG_INTERVAL)
+    fire(slider, "change_end")
+
+def type_name(page, text="Maria Grazia"):
+    field = find(page, lambda c: isinstance(c, ft.TextField) and c.label == "Il tuo nome")
+    for i in range(1, len(text) + 1):
+        field.value = text[:i]
+        fire(field, "change")
+        time.sleep(KEY_INTERVAL)
+
+def open_search(page):
+    fire(find(page, lambda c: isinstance(c, ft.Container) and isinstance(c.content, ft.Image) and c.content.src == app.FEATHER_MAP["search"]))
+
+def type_search(page, text="sono l'eroe"):
+    field = find(page, lambda c: isinstance(c, ft.TextField) and c.hint_text and c.hint_text.startswith("Cerca"))
+    for i in range(1, len(text) + 1):
+        field.value = text[:i]
+        fire(field, "change")
+        time.sleep(KEY_INTERVAL)
+
+def open_notes(page):
+    fire(find_text_button(page, "APRI LE TUE NOTE"))
+
+def type_notes(page, text="Canto di ingresso: pag. 12"):
+    navigate(page, 1)
+    open_notes(page)
+    field = find(page, lambda c: isinstance(c, ft.TextField) and c.multiline)
+    for i in range(1, len(text) + 1, 4):
+        field.value = text[:i]
+        fire(field, "change")
+
+def notes_button(page, icon):
+    return find(page, lambda c: isinstance(c, ft.Container) and c.on_click and isinstance(c.content, ft.Image) and c.content.src == app.FEATHER_MAP[icon] and c.content.width == 24)
+
+def seed_notes(lines):
+    # Note già salvate di una sessione precedente, lette all'apertura
+    def setup(page):
+        navigate(page, 1)
+        NotesJournal(page.client_storage).save("\n".join(f"riga {i} delle note" for i in range(lines)))
+    return setup
+
+def reader_back(page):
+    # La freccia indietro del lettore (la schermata con la lista delle pagine)
+    reader = find(page, lambda c: isinstance(c, ft.Container) and c.offset and any(isinstance(x, ft.ListView) for x in walk(c)))
+    return find(reader, lambda c: isinstance(c, ft.Container) and c.on_click and isinstance(c.content, ft.Image) and c.content.src == app.FEATHER_MAP["arrow-left"])
+
+def open_and_back(page, title):
+    # Apre una card e torna indietro subito, prima che il contenuto sia arrivato
+    dispatch((find_text_button(page, title), "click", None, ""), (reader_back(page), "click", None, ""))
+
+def gesture(page, name, cls, **data):
+    detector = find(page, lambda c: isinstance(c, ft.GestureDetector))
+    handler = getattr(detector, f"on_{name}")
+    handler(cls(ft.ControlEvent(detector.uid, name, json.dumps(data), detector, page)))
+
+def zoom_page(page, steps=30):
+    # Apre lo zoom sulla prima pagina, allarga con due dita e scorre fino in fondo
+    fire(find(page, lambda c: isinstance(c, ft.Container) and c.on_click and isinstance(c.content, ft.Image) and c.content.width == app.PAGE_DISPLAY_WIDTH))
+    gesture(page, "scale_start", ft.ScaleStartEvent)
+    for i in range(1, steps + 1):
+        gesture(page, "scale_update", ft.ScaleUpdateEvent, s=1 + i * 0.2, lfpx=200, lfpy=300)
+        time.sleep(DRAG_INTERVAL)
+    gesture(page, "scale_start", ft.ScaleStartEvent)
+    for _ in range(steps * 3):
+        gesture(page, "scale_update", ft.ScaleUpdateEvent, s=1, lfpx=200, lfpy=300, fpdx=-15, fpdy=-20)
+        time.sleep(DRAG_INTERVAL)
+
+# Ogni scenario: (preparazione non misurata, azione misurata)
+SCENARIOS = {
+    "startup": (None, None),
+    "startup_first_run": (None, None),
+    "navigate_1": (None, lambda p: navigate(p, 1)),
+    "navigate_0": (lambda p: navigate(p, 1), lambda p: navigate(p, 0)),
+    "theme_toggle": (lambda p: navigate(p, 1), toggle_theme),
+    "font_drag": (lambda p: navigate(p, 1), drag_font),
+    "type_name": (lambda p: navigate(p, 1), type_name),
+}
+SCENARIOS["font_drag_reader[Inno]"] = (lambda p: (navigate(p, 1), open_reader(p, "Inno")), drag_font)
+SCENARIOS["zoom_page"] = (lambda p: open_reader(p, "Lodi Mattutine"), zoom_page)
+SCENARIOS["prefetch"] = (None, prefetch)
+SCENARIOS["open_notes"] = (lambda p: navigate(p, 1), open_notes)
+SCENARIOS["open_notes[1000 righe]"] = (seed_notes(1000), open_notes)
+def edit_and_save(page):
+    # Una modifica ancora in attesa di salvataggio, poi il pulsante
+    field = find(page, lambda c: isinstance(c, ft.TextField) and c.multiline)
+    field.value += "."
+    fire(field, "change")
+    fire(notes_button(page, "save"))
+
+SCENARIOS["save_notes"] = (type_notes, edit_and_save)
+SCENARIOS["theme_toggle_notes"] = (lambda p: (navigate(p, 1), open_notes(p)), toggle_theme)
+SCENARIOS["open_reader_back"] = (lambda p: (open_reader(p, "Libretto"), fire(reader_back(p))), lambda p: open_and_back(p, "Lodi Mattutine"))
+SCENARIOS["type_name_home"] = (lambda p: navigate(p, 1), lambda p: (type_name(p), navigate(p, 0)))
+SCENARIOS["open_search"] = (None, open_search)
+SCENARIOS["type_search"] = (open_search, type_search)
+for _title in [item["title"] for item in app.CATALOG.items()]:
+    SCENARIOS[f"open_reader[{_title}]"] = (None, lambda p, t=_title: open_reader(p, t))
+for _title in [item["title"] for item in app.CATALOG.books()]:
+    SCENARIOS[f"open_reader_prefetched[{_title}]"] = (prefetch, lambda p, t=_title: open_reader(p, t))
+
+def run_scenario(name, repeat=3, storage_delay=0.0, inspect=None):
+    # inspect(page), se c'è, vede la sessione a fine scenario prima della chiusura
+    setup, action = SCENARIOS[name]
+    times, result = [], None
+    for _ in range(repeat):
+        storage = MemoryStorage(delay=storage_delay)
+        if name != "startup_first_run":
+            # Avvio tipico: il documento delle impostazioni esiste già
+            settings.save_settings(storage, dict(settings.DEFAULTS))
+            storage.writes = 0
+        page = BenchPage(storage)
+        # Ogni giro parte a freddo, come un processo nuovo: i contenuti non sono ancora stati letti
+        app.CATALOG.clear()
+        t0 = time.perf_counter()
+        app.main(page)
+        settle()
+        if action:
+            if setup: setup(page); settle()
+            before = page.counters()
+            page.latencies.clear()
+            t0 = time.perf_counter()
+            action(page)
+            settle()
+        else:
+            before = {k: 0 for k in page.counters()}
+        times.append((time.perf_counter() - t0) * 1000)
+        after = page.counters()
+        result = {k: after[k] - before[k] for k in after}
+        result["tree"] = sum(1 for _ in walk(page))
+        result["input_ms"] = round(max(page.latencies), 3) if action and page.latencies else 0
+        if inspect: inspect(page)
+        # Fine sessione, come alla chiusura del client: il suo prefetch non resta in coda per drain_all()
+        page.on_close(None)
+        page.loop.call_soon_threadsafe(page.loop.stop)
+    result["ms"] = round(statistics.median(times), 3)
+    return result
+
+def run_all(names=None, repeat=3, storage_delay=0.0):
+    return {name: run_scenario(name, repeat, storage_delay) for name in (names or SCENARIOS)}
+
+COLUMNS = ["ms", "input_ms", "updates", "controls", "bytes", "tree", "storage_reads", "storage_writes"]
+# Metriche deterministiche: un aumento è una regressione
+GATED = ["updates", "controls", "bytes", "storage_reads", "storage_writes"]
+
+def print_table(results, baseline=None):
+    print(f"{'scenario':40s}" + "".join(f"{c:>15s}" for c in COLUMNS))
+    for name, r in results.items():
+        cells = []
+        for c in COLUMNS:
+            cell = f"{r[c]:g}"
+            if baseline and name in baseline and c in baseline[name]: cell += f" ({r[c] - baseline[name][c]:+g})"
+            cells.append(f"{cell:>15s}")
+        print(f"{name:40s}" + "".join(cells))
+
+def regressions(results, baseline, tolerance=0.0):
+    found = []
+    for name, r in results.items():
+        for c in GATED:
+            old = baseline.get(name, {}).get(c)
+            if old is not None and r[c] > old * (1 + tolerance): found.append(f"{name}.{c}: {old} -> {r[c]}")
+    return found
+
+# --- RICERCA ---
+# Corpus sintetico: le parole dei testi del catalogo rimescolate in strofe, N volte
+# la dimensione attuale; misura costruzione, aggiornamento incrementale e ricerche
+# lettera per lettera.
+SYLLABLES = ["ca", "ro", "mi", "te", "so", "la", "ne", "vi", "pa", "do", "ri", "sta", "gno", "zio", "ple", "tu", "ma", "che"]
+
+def synthetic_corpus(words, lines, seed=1):
+    # Parole vere più parole inventate con frequenze alla Zipf, come in un testo reale
+    rnd = random.Random(seed)
+    vocab = list(dict.fromkeys(words)) + ["".join(rnd.choice(SYLLABLES) for _ in range(rnd.randint(2, 4))) for _ in range(lines // 2)]
+    weights = [1 / (rank + 1) for rank in range(len(vocab))]
+    out = []
+    for i in range(lines):
+        out.append(" ".join(rnd.choices(vocab, weights, k=rnd.randint(3, 9))))
+        if i % 5 == 4: out.append("")
+    return "\n".join(out)
+
+def search_benchmark(scale=200, queries=("sono l'eroe", "perche", "cuore", "mostri sotto", "riposi")):
+    base = "\n\n".join(app.CATALOG.text(item) for item in app.CATALOG.items() if item["kind"] == "song")
+    words = base.split()
+    corpus = synthetic_corpus(words, base.count("\n") * scale)
+    index = search.SearchIndex()
+    t0 = time.perf_counter()
+    for i, chunk in enumerate(text_chunks(corpus)):
+        index.add(("song", "bench", i), chunk, {"kind": "song", "order": i})
+    build_ms = (time.perf_counter() - t0) * 1000
+    print(f"corpus: {len(corpus)} caratteri ({scale}x), {len(index.docs)} strofe, {len(index.words)} parole, indice in {build_ms:.0f} ms")
+
+    notes = search.LinesIndex(index)
+    notes.update(corpus[:len(corpus) // 4])
+    text = notes.lines[:]
+    edit_ms = []
+    for i in range(200):
+        # Un tasto alla volta in mezzo al testo
+        row = len(text) // 2
+        text[row] += random.choice("abcdefghilmnoprstuvz ")
+        t0 = time.perf_counter()
+        notes.update("\n".join(text))
+        edit_ms.append((time.perf_counter() - t0) * 1000)
+    print(f"modifica note: p50 {statistics.median(edit_ms):.3f} ms, max {max(edit_ms):.3f} ms")
+
+    query_ms = []
+    for q in queries:
+        for i in range(1, len(q) + 1):
+            t0 = time.perf_counter()
+            results = search.search(q[:i], index)
+            query_ms.append((time.perf_counter() - t0) * 1000)
+        print(f"  {q!r}: {len(results)} risultati")
+    query_ms.sort()
+    print(f"ricerca mentre si scrive: p50 {statistics.median(query_ms):.3f} ms, p99 {query_ms[int(0.99 * (len(query_ms) - 1))]:.3f} ms, max {query_ms[-1]:.3f} ms")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark headless di main() su una Page locale.")
+    parser.add_argument("scenarios", nargs="*", help=f"default: tutti ({', '.join(SCENARIOS)})")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--storage-delay", type=float, default=0.0, help="latenza simulata di client_storage in secondi")
+    parser.add_argument("--json", metavar="FILE", help="salva i risultati")
+    parser.add_argument("--baseline", metavar="FILE", help="confronta con un file salvato da --json")
+    parser.add_argument("--tolerance", type=float, default=0.0, help="aumento ammesso sulle metriche controllate (0.05 = 5%%)")
+    parser.add_argument("--search-scale", type=int, metavar="N", help="misura solo l'indice di ricerca su un corpus N volte i testi attuali")
+    args = parser.parse_args()
+
+    if args.search_scale:
+        search_benchmark(args.search_scale)
+        sys.exit(0)
+
+    results = run_all(args.scenarios, args.repeat, args.storage_delay)
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f: baseline = json.load(f)
+    print_table(results, baseline)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f: json.dump(results, f, indent=1)
+    if baseline:
+        found = regressions(results, baseline, args.tolerance)
+        for line in found: print("REGRESSIONE", line)
+        sys.exit(1 if found else 0)
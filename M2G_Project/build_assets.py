@@ -0,0 +1,152 @@
+import argparse
+import hashlib
+import json
+import os
+import shutil
+
+from app import APP_DIR, ASSET_MANIFEST, ASSETS_SRC_DIR, BUNDLE_DIR, PAGE_DISPLAY_WIDTH, PAGES_MANIFEST, pick_page_src
+from catalog import Catalog
+from tiles import TILE_QUALITY, TILE_SIZE, pyramid_levels, tile_src
+
+# --- BUILD DEGLI ASSET ---
+# Genera versioni ridimensionate e ricompresse di ogni pagina dei libretti del catalogo
+# (1x, 2x e 3x della larghezza del lettore), la piramide di tasselli per lo zoom
+# e il manifest letto da app.py, poi raccoglie tutto in un bundle indirizzato per
+# contenuto. Richiede Pillow (è in requirements.txt: serve anche nell'app, ad avatar.py)
+#
+#   python build_assets.py                              # bundle dell'app in assets/
+#   python build_assets.py --web ../assets              # solo quello della pagina web (index.html)
+PAGE_WIDTHS = [PAGE_DISPLAY_WIDTH, PAGE_DISPLAY_WIDTH * 2, PAGE_DISPLAY_WIDTH * 3]
+JPEG_QUALITY = 80
+# Varianti e tasselli generati (non versionati), da cui si compone il bundle insieme ad assets_src/
+GENERATED_DIR = os.path.join(APP_DIR, "generated")
+HASH_LEN = 10
+CATALOG = Catalog(ASSETS_SRC_DIR)
+
+def build_pages(force=False):
+    from PIL import Image
+
+    out_dir = os.path.join(GENERATED_DIR, "pages")
+    os.makedirs(out_dir, exist_ok=True)
+    manifest = {"version": 1, "pages": {}}
+
+    for name in sorted({img for book in CATALOG.books() for img in CATALOG.pages(book)}):
+        src_path = os.path.join(ASSETS_SRC_DIR, name)
+        stem = os.path.splitext(name)[0]
+        with Image.open(src_path) as im:
+            im = im.convert("RGB")
+            entry = {"width": im.width, "height": im.height, "bytes": os.path.getsize(src_path), "variants": []}
+            for w in PAGE_WIDTHS:
+                # Non ingrandiamo mai: oltre l'originale non c'è dettaglio in più
+                if w >= im.width: continue
+                rel = f"pages/{stem}_{w}.jpg"
+                dst_path = os.path.join(GENERATED_DIR, rel)
+                if force or not os.path.exists(dst_path) or os.path.getmtime(dst_path) < os.path.getmtime(src_path):
+                    h = round(im.height * w / im.width)
+                    im.resize((w, h), Image.LANCZOS).save(dst_path, "JPEG", quality=JPEG_QUALITY, optimize=True, progressive=True)
+                entry["variants"].append({"w": w, "src": rel, "bytes": os.path.getsize(dst_path)})
+            entry["tiles"] = build_tiles(im, stem, os.path.getmtime(src_path), force)
+        manifest["pages"][name] = entry
+        print(f"{name}: {entry['bytes']} -> " + ", ".join(f"{v['w']}px {v['bytes']}" for v in entry["variants"])
+              + f", {entry['tiles']['count']} tasselli su {len(entry['tiles']['levels'])} livelli")
+
+    with open(os.path.join(GENERATED_DIR, PAGES_MANIFEST), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=1)
+    return manifest
+
+def build_tiles(im, stem, src_mtime, force=False):
+    from PIL import Image
+
+    levels = pyramid_levels(im.width, im.height)
+    count = 0
+    level_im = im
+    for k, (w, h) in enumerate(levels):
+        # Ogni livello si ottiene dimezzando il precedente, non dall'originale
+        if level_im.size != (w, h): level_im = level_im.resize((w, h), Image.LANCZOS)
+        for row in range(-(-h // TILE_SIZE)):
+            for col in range(-(-w // TILE_SIZE)):
+                dst_path = os.path.join(GENERATED_DIR, tile_src(stem, k, col, row))
+                count += 1
+                if not force and os.path.exists(dst_path) and os.path.getmtime(dst_path) >= src_mtime: continue
+                os.makedirs(os.path.dirname(dst_path), exist_ok=True)
+                box = (col * TILE_SIZE, row * TILE_SIZE, min(w, (col + 1) * TILE_SIZE), min(h, (row + 1) * TILE_SIZE))
+                level_im.crop(box).save(dst_path, "JPEG", quality=TILE_QUALITY, optimize=True)
+    return {"size": TILE_SIZE, "levels": [list(l) for l in levels], "count": count}
+
+# --- BUNDLE ---
+# Ogni file finisce nel bundle una volta sola, con l'hash del contenuto nel nome:
+# file identici condividono la stessa copia e un file cambiato ha un nome nuovo, così
+# i client possono tenerli in cache senza scadenza. Solo manifest.json va rivalidato.
+def file_hash(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 16), b""): h.update(chunk)
+    return h.hexdigest()[:HASH_LEN]
+
+def covered_originals(manifest):
+    # Originali che il lettore dell'app non chiede mai: c'è una variante per la larghezza
+    # massima (PAGE_DISPLAY_WIDTH a 3x) e lo zoom usa i tasselli. La pagina web invece li usa.
+    return {name for name, entry in manifest["pages"].items()
+            if "tiles" in entry and any(v["w"] >= PAGE_WIDTHS[-1] for v in entry["variants"])}
+
+def build_bundle(out_dir=BUNDLE_DIR, skip=()):
+    files, by_hash = {}, {}
+    size = 0
+    for root in (ASSETS_SRC_DIR, GENERATED_DIR):
+        for dirpath, dirnames, names in os.walk(root):
+            dirnames.sort()
+            for name in sorted(names):
+                if name.startswith("."): continue
+                src_path = os.path.join(dirpath, name)
+                rel = os.path.relpath(src_path, root).replace(os.sep, "/")
+                if root == ASSETS_SRC_DIR and rel in skip: continue
+                digest = file_hash(src_path)
+                if digest not in by_hash:
+                    stem, ext = os.path.splitext(rel)
+                    by_hash[digest] = f"{stem}.{digest}{ext}"
+                    dst_path = os.path.join(out_dir, by_hash[digest])
+                    if not os.path.exists(dst_path):
+                        os.makedirs(os.path.dirname(dst_path), exist_ok=True)
+                        shutil.copyfile(src_path, dst_path)
+                    size += os.path.getsize(dst_path)
+                files[rel] = by_hash[digest]
+
+    # Via le versioni superate
+    keep = set(by_hash.values()) | {ASSET_MANIFEST}
+    for dirpath, _, names in os.walk(out_dir):
+        for name in names:
+            rel = os.path.relpath(os.path.join(dirpath, name), out_dir).replace(os.sep, "/")
+            if rel not in keep: os.remove(os.path.join(dirpath, name))
+
+    with open(os.path.join(out_dir, ASSET_MANIFEST), "w", encoding="utf-8") as f:
+        json.dump({"version": 1, "files": files}, f, indent=1, sort_keys=True)
+    print(f"{out_dir}: {len(files)} nomi, {len(by_hash)} file, {size} byte")
+    return files
+
+# --- REPORT ---
+# Byte trasferiti aprendo un libro: originali contro varianti scelte dal lettore
+def report(title, manifest, dpr):
+    before = after = 0
+    for img in CATALOG.pages(CATALOG.find(title)):
+        before += os.path.getsize(os.path.join(ASSETS_SRC_DIR, img))
+        src = pick_page_src(img, PAGE_DISPLAY_WIDTH, dpr, manifest["pages"])
+        after += os.path.getsize(os.path.join(GENERATED_DIR if src != img else ASSETS_SRC_DIR, src))
+    print(f"{title} @ {dpr}x: {before} byte -> {after} byte ({100 * after / before:.1f}%)")
+    return before, after
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Genera le pagine ridimensionate e il manifest per il lettore.")
+    parser.add_argument("--force", action="store_true", help="rigenera anche le varianti già aggiornate")
+    parser.add_argument("--report", metavar="TITOLO", help='es. "Lodi Mattutine"')
+    parser.add_argument("--dpr", type=float, nargs="*", default=[1.0, 2.0, 3.0])
+    parser.add_argument("--out", nargs="*", help="cartelle in cui scrivere il bundle dell'app (default assets/)")
+    parser.add_argument("--web", nargs="*", default=[], help="cartelle in cui scrivere il bundle della pagina web, con gli originali")
+    args = parser.parse_args()
+
+    manifest = build_pages(force=args.force)
+    skip = covered_originals(manifest)
+    for out_dir in args.out if args.out is not None else ([] if args.web else [BUNDLE_DIR]):
+        build_bundle(out_dir, skip)
+    for out_dir in args.web: build_bundle(out_dir)
+    if args.report:
+        for dpr in args.dpr: report(args.report, manifest, dpr)
@@ -0,0 +1,75 @@
+import json
+import os
+import threading
+from collections import OrderedDict
+
+# --- CATALOGO ---
+# Libretti, canti e album non sono più nel codice: catalog/index.json elenca le card
+# (id, titolo, icona, tipo e i riferimenti ai contenuti) e resta piccolo; l'elenco
+# delle pagine e i testi stanno in file a parte, letti solo quando si apre la card.
+#
+#   book: "pages" -> {"pages": ["lodi1.jpg", ...]}
+#   song: "text"  -> testo semplice, "audio" facoltativo
+#   link: "url"
+CATALOG_INDEX = "catalog/index.json"
+BODY_CACHE = 8  # contenuti tenuti in memoria, condivisi fra le sessioni
+
+class Catalog:
+    def __init__(self, folder, resolve=lambda name: name):
+        self.folder = folder
+        self.resolve = resolve
+        self._index = None
+        self._bodies = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _read(self, name):
+        with open(os.path.join(self.folder, self.resolve(name)), encoding="utf-8") as f:
+            return f.read()
+
+    def items(self):
+        if self._index is None:
+            try: self._index = json.loads(self._read(CATALOG_INDEX)).get("items", [])
+            except: self._index = []
+        return self._index
+
+    def get(self, item_id):
+        for item in self.items():
+            if item["id"] == item_id: return item
+        raise KeyError(item_id)
+
+    def find(self, title):
+        for item in self.items():
+            if item["title"] == title: return item
+        raise KeyError(title)
+
+    def _body(self, name):
+        with self._lock:
+            if name in self._bodies:
+                self._bodies.move_to_end(name)
+                return self._bodies[name]
+        body = self._read(name)
+        with self._lock:
+            self._bodies[name] = body
+            while len(self._bodies) > BODY_CACHE: self._bodies.popitem(last=False)
+        return body
+
+    def pages(self, item):
+        if not item.get("pages"): return []
+        try: return json.loads(self._body(item["pages"])).get("pages", [])
+        except: return []
+
+    def text(self, item):
+        if not item.get("text"): return ""
+        try: return self._body(item["text"])
+        except: return ""
+
+    def cached(self, item):
+        # Contenuti già in memoria: aprire la card non richiede letture
+        with self._lock:
+            return all(item[key] in self._bodies for key in ("pages", "text") if item.get(key))
+
+    def clear(self):
+        with self._lock: self._bodies.clear()
+
+    def books(self):
+        return [item for item in self.items() if item["kind"] == "book"]
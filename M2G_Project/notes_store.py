@@ -0,0 +1,107 @@
+import threading
+
+# --- NOTE (JOURNAL) ---
+# Le note non vengono più riscritte per intero a ogni salvataggio: ogni modifica
+# diventa un piccolo delta (posizione, caratteri rimossi, testo inserito) aggiunto
+# a un journal in client_storage, una chiave per voce. Ogni tanto il journal viene
+# compattato in uno snapshot e le voci già incluse vengono cancellate.
+SNAPSHOT_KEY = "notes_snapshot"
+ENTRY_PREFIX = "notes_j."
+
+def make_delta(old, new):
+    # Prefisso e suffisso comuni: resta solo la parte cambiata
+    n = min(len(old), len(new))
+    p = 0
+    while p < n and old[p] == new[p]: p += 1
+    s = 0
+    while s < n - p and old[-1 - s] == new[-1 - s]: s += 1
+    return p, len(old) - p - s, new[p:len(new) - s]
+
+def apply_delta(text, entry):
+    at, removed, ins = entry["at"], entry["del"], entry["ins"]
+    if at < 0 or removed < 0 or at + removed > len(text): raise ValueError("delta fuori dal testo")
+    out = text[:at] + ins + text[at + removed:]
+    if len(out) != entry["n"]: raise ValueError("lunghezza non coerente")
+    return out
+
+def entry_key(seq):
+    return f"{ENTRY_PREFIX}{seq:08d}"
+
+
+class NotesJournal:
+    def __init__(self, storage, compact_entries=40, compact_bytes=8000):
+        self.storage = storage
+        self.compact_entries = compact_entries
+        self.compact_bytes = compact_bytes
+        self.text = ""
+        self.base_seq = 0  # seq dello snapshot
+        self.seq = 0       # ultima voce scritta
+        self.journal_bytes = 0
+        self._lock = threading.Lock()
+
+    def load(self, fallback=""):
+        with self._lock:
+            snap = self.storage.get(SNAPSHOT_KEY)
+            if not isinstance(snap, dict) or not isinstance(snap.get("text"), str):
+                # Primo avvio: le note arrivano dal vecchio salvataggio completo
+                self.text, self.seq, self.base_seq = fallback or "", 0, 0
+                self._write_snapshot()
+                return self.text
+
+            self.text = snap["text"]
+            self.seq = self.base_seq = int(snap.get("seq", 0))
+            keys = sorted(k for k in (self.storage.get_keys(ENTRY_PREFIX) or []) if k.startswith(ENTRY_PREFIX))
+            stale, broken = [], False
+            for key in keys:
+                try: seq = int(key[len(ENTRY_PREFIX):])
+                except ValueError: seq = -1
+                if seq <= self.base_seq or broken:
+                    stale.append(key)
+                    continue
+                try:
+                    # Voci mancanti o scritte a metà interrompono la ricostruzione:
+                    # quello che segue dipende da uno stato che non abbiamo
+                    if seq != self.seq + 1: raise ValueError("buco nel journal")
+                    entry = self.storage.get(key)
+                    self.text = apply_delta(self.text, entry)
+                    self.seq = seq
+                    self.journal_bytes += len(entry["ins"])
+                except Exception:
+                    broken = True
+                    stale.append(key)
+            if broken:
+                self._write_snapshot()
+            else:
+                for key in stale: self._remove(key)
+            return self.text
+
+    def save(self, text):
+        # Scrive solo il delta rispetto all'ultimo stato salvato; True se c'era qualcosa da scrivere
+        with self._lock:
+            if text == self.text: return False
+            at, removed, ins = make_delta(self.text, text)
+            entry = {"at": at, "del": removed, "ins": ins, "n": len(text)}
+            self.storage.set(entry_key(self.seq + 1), entry)
+            self.seq += 1
+            self.text = text
+            self.journal_bytes += len(ins)
+            if self.seq - self.base_seq >= self.compact_entries or self.journal_bytes >= self.compact_bytes:
+                self._write_snapshot()
+            return True
+
+    def compact(self):
+        with self._lock:
+            if self.seq != self.base_seq: self._write_snapshot()
+
+    def _write_snapshot(self):
+        # Prima lo snapshot, poi la pulizia: se si interrompe a metà, le voci
+        # rimaste hanno seq <= snapshot e vengono ignorate al prossimo avvio
+        self.storage.set(SNAPSHOT_KEY, {"seq": self.seq, "text": self.text})
+        self.base_seq = self.seq
+        self.journal_bytes = 0
+        for key in self.storage.get_keys(ENTRY_PREFIX) or []:
+            if key.startswith(ENTRY_PREFIX): self._remove(key)
+
+    def _remove(self, key):
+        try: self.storage.remove(key)
+        except: pass
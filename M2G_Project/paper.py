@@ -0,0 +1,43 @@
+import base64
+import struct
+import zlib
+from functools import lru_cache
+
+import flet as ft
+
+# --- CARTA A RIGHE ---
+# Le righe del foglio delle note non sono controlli: sono un tassello alto una riga,
+# con il tratto in fondo, ripetuto come immagine di sfondo del campo di testo. Il
+# client dipinge solo la parte visibile, l'area segue da sola la lunghezza delle note
+# e cambiare tema o corpo sostituisce un solo valore.
+LINE_HEIGHT = 1.6  # interlinea delle note, in multipli del corpo
+TILE_WIDTH = 4
+
+def line_height(size):
+    # In pixel interi: righe del testo e tasselli non si sfasano scendendo nel foglio
+    return round(size * LINE_HEIGHT)
+
+def text_style(size):
+    # Interlinea del campo di testo uguale all'altezza del tassello
+    return ft.TextStyle(height=line_height(size) / size)
+
+def _png(width, height, pixel):
+    # PNG RGBA minimo; pixel(x, y) -> 4 byte
+    def chunk(kind, body):
+        return struct.pack(">I", len(body)) + kind + body + struct.pack(">I", zlib.crc32(kind + body))
+    rows = b"".join(b"\0" + b"".join(pixel(x, y) for x in range(width)) for y in range(height))
+    return (b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 6, 0, 0, 0))
+            + chunk(b"IDAT", zlib.compress(rows, 9)) + chunk(b"IEND", b""))
+
+@lru_cache(maxsize=32)
+def _tile(color, height, dpr):
+    rgba = bytes.fromhex(color.lstrip("#")[:6]) + b"\xff"
+    line = max(1, round(dpr))
+    data = _png(TILE_WIDTH, height * dpr, lambda x, y: rgba if y >= height * dpr - line else b"\0\0\0\0")
+    return base64.b64encode(data).decode("ascii")
+
+def ruled(color, size, dpr=1):
+    # Sfondo per un campo con text_style(size): una riga ogni line_height(size) pixel
+    dpr = max(1, round(dpr))
+    return ft.DecorationImage(src_base64=_tile(color, line_height(size), dpr), repeat=ft.ImageRepeat.REPEAT,
+                              alignment=ft.alignment.top_left, scale=dpr)
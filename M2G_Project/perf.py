@@ -0,0 +1,149 @@
+import asyncio
+import contextvars
+import functools
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+
+# --- MISURE ---
+# Tempi delle fasi di avvio, da load_settings fino al primo page.update().
+# Finiscono nel log "m2g.perf" (anche in produzione) e restano leggibili da last_startup.
+logger = logging.getLogger("m2g.perf")
+
+last_startup = {}
+
+class PhaseTimer:
+    def __init__(self, name):
+        self.name = name
+        self.t0 = self.last = time.perf_counter()
+        self.phases = {}
+
+    def mark(self, phase):
+        now = time.perf_counter()
+        self.phases[phase] = (now - self.last) * 1000
+        self.last = now
+
+    def done(self):
+        total = (time.perf_counter() - self.t0) * 1000
+        report = {**self.phases, "total": total}
+        last_startup.clear()
+        last_startup.update(report)
+        logger.info("%s %s", self.name, " ".join(f"{k}={v:.1f}ms" for k, v in report.items()))
+        return report
+
+
+# --- STRUMENTAZIONE DEGLI HANDLER (opt-in) ---
+# Con M2G_PERF=1 (o perf.enable()) ogni handler registrato con handler() misura
+# latenza, numero di update() inviati e byte serializzati. I campioni vanno in un
+# istogramma a finestra mobile per handler. Da spento handler() restituisce la
+# funzione originale: nessun costo aggiuntivo. Gli handler async si misurano fino
+# alla fine, attese comprese; il conteggio segue il task (contextvars), non il thread.
+ENABLED = os.environ.get("M2G_PERF") == "1"
+WINDOW = 512
+
+stats = {}
+_current = contextvars.ContextVar("m2g_perf_frame", default=None)
+_lock = threading.Lock()
+
+def enable(on=True):
+    global ENABLED
+    ENABLED = on
+
+class Histogram:
+    def __init__(self, window=WINDOW):
+        self.samples = deque(maxlen=window)
+        self.count = 0
+
+    def add(self, ms, updates, size):
+        self.samples.append((ms, updates, size))
+        self.count += 1
+
+    def summary(self):
+        ms = sorted(s[0] for s in self.samples)
+        if not ms: return {"count": self.count}
+        pick = lambda q: ms[min(len(ms) - 1, int(q * len(ms)))]
+        return {
+            "count": self.count,
+            "p50_ms": round(pick(0.50), 3), "p90_ms": round(pick(0.90), 3), "p99_ms": round(pick(0.99), 3), "max_ms": round(ms[-1], 3),
+            "updates_avg": round(sum(s[1] for s in self.samples) / len(self.samples), 2),
+            "bytes_avg": round(sum(s[2] for s in self.samples) / len(self.samples)),
+            "bytes_max": max(s[2] for s in self.samples),
+        }
+
+def _enter():
+    outer = _current.get()
+    frame = [0, 0]
+    return outer, frame, _current.set(frame), time.perf_counter()
+
+def _leave(name, outer, frame, token, t0):
+    ms = (time.perf_counter() - t0) * 1000
+    _current.reset(token)
+    # Un handler annidato conta anche per quello che lo ha chiamato
+    if outer is not None:
+        outer[0] += frame[0]
+        outer[1] += frame[1]
+    with _lock:
+        stats.setdefault(name, Histogram()).add(ms, frame[0], frame[1])
+
+def handler(name, fn):
+    if not ENABLED or fn is None: return fn
+
+    if asyncio.iscoroutinefunction(fn):
+        @functools.wraps(fn)
+        async def async_wrapper(*args, **kwargs):
+            outer, frame, token, t0 = _enter()
+            try:
+                return await fn(*args, **kwargs)
+            finally:
+                _leave(name, outer, frame, token, t0)
+        return async_wrapper
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        outer, frame, token, t0 = _enter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _leave(name, outer, frame, token, t0)
+    return wrapper
+
+def timed(name):
+    # Decoratore: @perf.timed("navigate")
+    return lambda fn: handler(name, fn)
+
+def watch_connection(conn):
+    # Intercetta gli invii della connessione per attribuirli all'handler in corso
+    if not ENABLED or conn is None or getattr(conn, "_m2g_watched", False): return
+    # Modulo interno di Flet (fissato a 0.25 in requirements.txt): si importa solo con M2G_PERF=1
+    from flet.core.protocol import CommandEncoder
+    send_command, send_commands = conn.send_command, conn.send_commands
+
+    def record(commands):
+        frame = _current.get()
+        if frame is None: return
+        frame[0] += 1
+        frame[1] += sum(len(json.dumps(c, cls=CommandEncoder, separators=(",", ":"))) for c in commands)
+
+    def watched_command(session_id, command):
+        record([command])
+        return send_command(session_id, command)
+
+    def watched_commands(session_id, commands):
+        record(commands)
+        return send_commands(session_id, commands)
+
+    conn.send_command, conn.send_commands = watched_command, watched_commands
+    conn._m2g_watched = True
+
+def summary():
+    with _lock:
+        return {name: h.summary() for name, h in sorted(stats.items())}
+
+def dump(path=None):
+    path = path or os.path.join(os.environ.get("FLET_APP_STORAGE_DATA") or ".", "m2g_perf.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"startup": last_startup, "handlers": summary()}, f, indent=1)
+    return path
@@ -0,0 +1,208 @@
+import asyncio
+import contextvars
+import functools
+import itertools
+import threading
+import time
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+
+# --- SCHEDULER ---
+# Gli handler ad alta frequenza (tasti, slider) non scrivono e non aggiornano subito:
+# le scritture su client_storage vengono accorpate (debounce) e gli update() della UI
+# vengono fusi in uno solo per frame. flush() forza l'esecuzione immediata.
+
+_instances = weakref.WeakSet()
+_prefetchers = weakref.WeakSet()
+
+# Il benchmark lo spegne per avere misure ripetibili e usa drain_all()
+IDLE_PREFETCH = True
+
+def flush_all():
+    # Svuota tutte le code ancora in attesa (chiusura del processo, benchmark)
+    for item in list(_instances): item.flush()
+
+def drain_all():
+    # Esegue subito tutto il prefetch in coda
+    for item in list(_prefetchers): item.drain()
+
+class Debouncer:
+    # Esegue fn una sola volta, delay secondi dopo l'ultima richiesta
+    def __init__(self, fn, delay=0.5):
+        self.fn = fn
+        self.delay = delay
+        self._lock = threading.Lock()
+        self._timer = None
+        self._pending = False
+        _instances.add(self)
+
+    def __call__(self):
+        with self._lock:
+            if self._timer: self._timer.cancel()
+            self._pending = True
+            self._timer = threading.Timer(self.delay, self.flush)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def flush(self):
+        with self._lock:
+            if self._timer: self._timer.cancel()
+            self._timer = None
+            pending, self._pending = self._pending, False
+        if pending: self.fn()
+
+
+class FrameBatcher:
+    # Raccoglie i controlli da aggiornare e li invia con un solo page.update() per frame
+    def __init__(self, page, interval=1 / 30):
+        self.page = page
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._controls = {}
+        self._timer = None
+        _instances.add(self)
+
+    def request(self, *controls):
+        with self._lock:
+            for c in controls: self._controls[id(c)] = c
+            if self._timer: return
+            self._timer = threading.Timer(self.interval, self.flush)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def flush(self):
+        with self._lock:
+            if self._timer: self._timer.cancel()
+            self._timer = None
+            controls, self._controls = list(self._controls.values()), {}
+        if controls:
+            try: self.page.update(*controls)
+            except: pass
+
+
+class IdlePrefetcher:
+    # Compiti di riscaldamento eseguiti uno alla volta, in ordine di priorità, solo
+    # quando l'utente è fermo da almeno idle secondi. touch() a ogni interazione li
+    # sospende; un compito che sfora il budget di byte (o quello di memoria) si salta.
+    # cost() -> (byte da scaricare, byte in memoria) si valuta solo al momento di eseguire.
+    def __init__(self, budget, memory_cap, idle=1.0, step=0.05):
+        self.budget = budget
+        self.memory_cap = memory_cap
+        self.idle = idle
+        self.step = step
+        self.spent = 0
+        self.memory = 0
+        self._tasks = []
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+        self._timer = None
+        self._stopped = False
+        self._touched = 0.0
+        _prefetchers.add(self)
+
+    def add(self, fn, cost=None, priority=0):
+        with self._lock:
+            self._tasks.append((priority, next(self._seq), cost, fn))
+            self._tasks.sort(key=lambda t: t[:2])
+
+    def _schedule(self, delay=None):
+        with self._lock:
+            if self._timer: self._timer.cancel()
+            self._timer = None
+            if delay is None or self._stopped or not self._tasks or not IDLE_PREFETCH: return
+            self._timer = threading.Timer(delay, self._tick)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def start(self):
+        self._schedule(self.idle)
+
+    def touch(self):
+        self._touched = time.monotonic()
+        if self._tasks: self._schedule(self.idle)
+
+    def _idle_left(self):
+        return self.idle - (time.monotonic() - self._touched)
+
+    def pause(self):
+        # App in background: si riprende con start()
+        self._schedule()
+
+    def stop(self):
+        # Sessione chiusa: i compiti in coda non servono più (e non vanno eseguiti da drain())
+        self._stopped = True
+        self._schedule()
+        with self._lock: self._tasks.clear()
+
+    def _next(self):
+        # cost() può leggere file: si valuta fuori dal lock, così touch() non lo aspetta
+        while True:
+            with self._lock:
+                if not self._tasks: return None
+                _, _, cost, fn = self._tasks.pop(0)
+            try: size, memory = cost() if cost else (0, 0)
+            except: continue
+            with self._lock:
+                if self.spent + size > self.budget or self.memory + memory > self.memory_cap: continue
+                self.spent += size
+                self.memory += memory
+                return fn
+
+    def _tick(self):
+        # Un touch() arrivato mentre il timer partiva: si aspetta il resto della pausa
+        left = self._idle_left()
+        if left > 0: return self._schedule(left)
+        fn = self._next()
+        if fn is None: return
+        try: fn()
+        except: pass
+        # Se l'utente ha interagito durante il compito il prossimo attende di nuovo idle
+        self._schedule(max(self.step, self._idle_left()))
+
+    def drain(self):
+        while True:
+            fn = self._next()
+            if fn is None: return
+            try: fn()
+            except: pass
+
+
+# --- LAVORO BLOCCANTE ---
+# Gli handler async girano sul loop della sessione e non devono mai fermarlo: letture
+# e scritture di client_storage, file e immagini passano da offload() a un pool di
+# pochi thread condiviso dal processo. Uno storage lento occupa al più BLOCKING_WORKERS
+# thread e intanto il loop continua a rispondere ai tocchi di tutte le sessioni.
+BLOCKING_WORKERS = 4
+
+_blocking_pool = None
+_pool_lock = threading.Lock()
+
+def blocking_pool():
+    global _blocking_pool
+    with _pool_lock:
+        if _blocking_pool is None:
+            _blocking_pool = ThreadPoolExecutor(max_workers=BLOCKING_WORKERS, thread_name_prefix="m2g-blocking")
+        return _blocking_pool
+
+async def offload(fn, *args):
+    # Il contesto (es. la misura dell'handler in corso) segue fn nel thread
+    call = functools.partial(contextvars.copy_context().run, fn, *args)
+    return await asyncio.get_running_loop().run_in_executor(blocking_pool(), call)
+
+
+class Latest:
+    # L'ultimo task avviato per una schermata: claim() da un nuovo handler annulla il
+    # precedente ancora in corso, cancel() annulla quello attuale (l'utente è tornato
+    # indietro). Il lavoro già nel pool finisce comunque, ma il risultato si scarta.
+    # Da usare solo dal loop della sessione.
+    def __init__(self):
+        self._task = None
+
+    def claim(self):
+        task = asyncio.current_task()
+        if self._task is not task: self.cancel()
+        self._task = task
+
+    def cancel(self):
+        if self._task is not None and not self._task.done(): self._task.cancel()
+        self._task = None
@@ -0,0 +1,136 @@
+import itertools
+import re
+import threading
+import unicodedata
+from bisect import bisect_left, insort
+
+from virtual_list import text_chunks
+
+# --- RICERCA ---
+# Indice invertito incrementale: parola normalizzata -> documenti che la contengono.
+# La normalizzazione toglie accenti e maiuscole (perché = perche, È = e) e spezza le
+# elisioni (l'eroe -> l, eroe); le parole di una lettera non si indicizzano. Ogni
+# parola della ricerca vale anche come prefisso, così si può cercare mentre si scrive.
+MIN_TOKEN = 2
+RESULTS = 30
+KIND_ORDER = {"title": 0, "song": 1, "notes": 2}
+TOKEN_RE = re.compile(r"[^\W_]+")
+
+def fold(text):
+    text = unicodedata.normalize("NFD", text.casefold())
+    return "".join(ch for ch in text if not unicodedata.combining(ch))
+
+def tokens(text):
+    return [t for t in TOKEN_RE.findall(fold(text)) if len(t) >= MIN_TOKEN]
+
+class SearchIndex:
+    def __init__(self):
+        self.postings = {}  # parola -> set di id
+        self.words = []     # parole ordinate, per la ricerca per prefisso
+        self.docs = {}      # id -> (parole, testo, dati)
+
+    def add(self, doc_id, text, payload):
+        if doc_id in self.docs: self.remove(doc_id)
+        words = set(tokens(text))
+        self.docs[doc_id] = (words, text, payload)
+        for w in words:
+            ids = self.postings.get(w)
+            if ids is None:
+                ids = self.postings[w] = set()
+                insort(self.words, w)
+            ids.add(doc_id)
+
+    def remove(self, doc_id):
+        doc = self.docs.pop(doc_id, None)
+        if doc is None: return
+        for w in doc[0]:
+            ids = self.postings[w]
+            ids.discard(doc_id)
+            if not ids:
+                del self.postings[w]
+                del self.words[bisect_left(self.words, w)]
+
+    def _matching(self, prefix):
+        # Documenti con una parola che inizia per prefix: {id: 2 se esatta, 1 se prefisso}
+        found = {}
+        i = bisect_left(self.words, prefix)
+        while i < len(self.words) and self.words[i].startswith(prefix):
+            score = 2 if self.words[i] == prefix else 1
+            for doc_id in self.postings[self.words[i]]:
+                if found.get(doc_id, 0) < score: found[doc_id] = score
+            i += 1
+        return found
+
+    def search(self, query):
+        terms = tokens(query)
+        if not terms: return []
+        matches = []
+        for term in terms:
+            found = self._matching(term)
+            if not found: return []
+            matches.append(found)
+        # Si interseca partendo dal termine con meno documenti: l'insieme resta piccolo
+        matches.sort(key=len)
+        scores = matches[0]
+        for found in matches[1:]:
+            scores = {d: s + found[d] for d, s in scores.items() if d in found}
+            if not scores: return []
+        return [(score, doc_id, self.docs[doc_id]) for doc_id, score in scores.items()]
+
+def snippet(text, query, width=80):
+    # La prima riga che contiene un termine della ricerca
+    terms = tokens(query)
+    for line in text.split("\n"):
+        folded = fold(line)
+        if any(t in folded for t in terms): return line.strip()[:width]
+    return text.strip().split("\n")[0][:width]
+
+def search(query, *indexes, limit=RESULTS):
+    hits = [hit for index in indexes for hit in index.search(query)]
+    hits.sort(key=lambda h: (-h[0], KIND_ORDER.get(h[2][2]["kind"], 9), h[2][2].get("order", 0)))
+    return [{**payload, "snippet": snippet(text, query)} for _, _, (_, text, payload) in hits[:limit]]
+
+
+# --- CONTENUTI ---
+# Catalogo: titoli e testi dei canti (una strofa per documento), costruito una volta
+# e condiviso dalle sessioni. Note: un documento per riga, aggiornato a ogni modifica.
+_catalog_indexes = {}
+_catalog_lock = threading.Lock()
+
+def catalog_index(catalog):
+    with _catalog_lock:
+        index = _catalog_indexes.get(id(catalog))
+        if index is None:
+            index = _catalog_indexes[id(catalog)] = SearchIndex()
+            for order, item in enumerate(catalog.items()):
+                index.add(("title", item["id"]), item["title"], {"kind": "title", "item": item["id"], "title": item["title"], "order": order})
+                if item["kind"] == "song":
+                    for i, chunk in enumerate(text_chunks(catalog.text(item))):
+                        index.add(("song", item["id"], i), chunk, {"kind": "song", "item": item["id"], "title": item["title"], "chunk": i, "order": order * 10000 + i})
+        return index
+
+class LinesIndex:
+    # Righe di un testo che cambia: a ogni modifica si reindicizzano solo quelle cambiate
+    # (prefisso e suffisso comuni restano dove sono)
+    def __init__(self, index, kind="notes"):
+        self.index = index
+        self.kind = kind
+        self.lines = []
+        self.ids = []
+        self._seq = itertools.count()
+
+    def update(self, text):
+        old, new = self.lines, text.split("\n")
+        p = 0
+        while p < len(old) and p < len(new) and old[p] == new[p]: p += 1
+        s = 0
+        while s < len(old) - p and s < len(new) - p and old[-1 - s] == new[-1 - s]: s += 1
+        for doc_id in self.ids[p:len(old) - s]: self.index.remove(doc_id)
+        fresh = []
+        for line in new[p:len(new) - s]:
+            doc_id = (self.kind, next(self._seq))
+            if line.strip(): self.index.add(doc_id, line, {"kind": self.kind, "doc": doc_id})
+            fresh.append(doc_id)
+        self.ids[p:len(old) - s] = fresh
+        self.lines = new
+        return len(fresh)
@@ -0,0 +1,79 @@
+# --- IMPOSTAZIONI ---
+# Tutto lo stato dell'utente sta in un unico documento versionato in client_storage:
+# all'avvio basta una sola lettura invece di una per chiave.
+# Le note hanno un loro journal (notes_store.py): dalla versione 2 non stanno più qui,
+# ma quelle migrate da un layout precedente restano nel documento finché il journal
+# non ha scritto il suo primo snapshot (altrimenti esisterebbero solo in memoria).
+SETTINGS_KEY = "m2g_settings"
+SETTINGS_VERSION = 2
+
+# pic / pic_nav: miniature dell'avatar (nomi di file in avatar_dir(), vedi avatar.py)
+DEFAULTS = {"name": "Utente", "font": 16.0, "dark": False, "pic": "user.svg", "pic_nav": "user.svg"}
+
+# Vecchio layout: una chiave per campo (versione 0)
+LEGACY_KEYS = {"name": "user_name", "notes": "user_notes", "font": "font_size", "dark": "dark_mode", "pic": "profile_pic"}
+
+NAME_MAX = 14
+NOTES_MAX = 10000
+FONT_MIN, FONT_MAX = 12.0, 30.0
+
+def validate(doc):
+    # Controlla e ripara tutti i campi in un solo passaggio; i valori non validi tornano ai default
+    doc = doc if isinstance(doc, dict) else {}
+    s = dict(DEFAULTS)
+
+    name = doc.get("name")
+    if isinstance(name, str) and name.strip(): s["name"] = name[:NAME_MAX]
+
+    # Solo per la migrazione (layout per chiavi o versione 1): passa al journal delle note
+    notes = doc.get("notes")
+    if isinstance(notes, str): s["notes"] = notes[:NOTES_MAX]
+
+    try: s["font"] = min(FONT_MAX, max(FONT_MIN, float(doc.get("font"))))
+    except (TypeError, ValueError): pass
+
+    s["dark"] = doc.get("dark") is True
+
+    # Pulizia percorsi Windows / assoluti rimasti da vecchie versioni
+    pic, pic_nav = doc.get("pic"), doc.get("pic_nav")
+    if valid_pic(pic):
+        s["pic"] = pic
+        s["pic_nav"] = pic_nav if valid_pic(pic_nav) else pic
+    return s
+
+def valid_pic(pic):
+    return isinstance(pic, str) and pic and not ("C:" in pic or "\\" in pic or pic.startswith("/"))
+
+def read_legacy(storage):
+    return {field: storage.get(key) for field, key in LEGACY_KEYS.items()}
+
+def remove_legacy(storage):
+    for key in LEGACY_KEYS.values():
+        try: storage.remove(key)
+        except: pass
+
+def load_settings(storage):
+    try:
+        doc = storage.get(SETTINGS_KEY)
+    except:
+        return dict(DEFAULTS)
+    if isinstance(doc, dict) and "version" in doc:
+        settings = validate(doc)
+        # Versioni precedenti: si riscrive subito il documento nel formato attuale
+        if doc["version"] != SETTINGS_VERSION: save_settings(storage, settings)
+        return settings
+
+    # Primo avvio con il nuovo formato: si importa il vecchio layout per chiavi,
+    # e lo si cancella solo dopo aver scritto il documento nuovo
+    try: settings = validate(read_legacy(storage))
+    except: settings = dict(DEFAULTS)
+    if save_settings(storage, settings): remove_legacy(storage)
+    return settings
+
+def save_settings(storage, settings):
+    try:
+        doc = {k: v for k, v in settings.items() if k in DEFAULTS or k == "notes"}
+        storage.set(SETTINGS_KEY, {"version": SETTINGS_VERSION, **doc})
+        return True
+    except:
+        return False
@@ -0,0 +1,169 @@
+import math
+from collections import OrderedDict
+
+import flet as ft
+
+# --- TASSELLI ---
+# Piramide per lo zoom delle pagine, generata da build_assets.py: il livello 0 è la
+# scansione a piena risoluzione, ogni livello successivo dimezza, l'ultimo sta in un
+# solo tassello. Il visore mostra solo i tasselli che cadono nella viewport al livello
+# adatto allo zoom corrente; quelli usati di recente restano in una cache LRU limitata.
+TILE_SIZE = 512
+TILE_QUALITY = 80
+TILE_CACHE = 64      # controlli Image tenuti dal server per sessione (non limita la memoria del client)
+TILE_MAX_DPR = 2.0   # oltre 2x il testo è già leggibile: si risparmia un livello intero
+MAX_ZOOM = 1.0       # pixel logici per pixel della scansione
+
+def pyramid_levels(width, height, tile=TILE_SIZE):
+    levels = [(width, height)]
+    while levels[-1][0] > tile or levels[-1][1] > tile:
+        w, h = levels[-1]
+        levels.append(((w + 1) // 2, (h + 1) // 2))
+    return levels
+
+def tile_src(stem, level, col, row):
+    return f"tiles/{stem}/{level}/{col}_{row}.jpg"
+
+def pick_level(levels, zoom, dpr):
+    # Il livello più piccolo ancora nitido: scala 2^-k >= pixel fisici per pixel sorgente
+    needed = zoom * min(dpr, TILE_MAX_DPR)
+    if needed >= 1: return 0
+    return max(0, min(len(levels) - 1, int(math.floor(math.log2(1 / needed)))))
+
+def visible_tiles(levels, level, x0, y0, x1, y1, tile=TILE_SIZE):
+    # Tasselli del livello che intersecano il rettangolo (coordinate della scansione)
+    w, h = levels[level]
+    scale = 1 / 2 ** level
+    cols, rows = math.ceil(w / tile), math.ceil(h / tile)
+    c0, c1 = max(0, int(x0 * scale // tile)), min(cols, math.ceil(x1 * scale / tile))
+    r0, r1 = max(0, int(y0 * scale // tile)), min(rows, math.ceil(y1 * scale / tile))
+    for row in range(r0, r1):
+        for col in range(c0, c1):
+            tw, th = min(tile, w - col * tile), min(tile, h - row * tile)
+            yield col, row, (col * tile / scale, row * tile / scale, tw / scale, th / scale)
+
+
+class TileCache:
+    # LRU dei controlli Image lato server: un tassello che torna nella viewport riusa il suo
+    # controllo e al client arriva solo la nuova posizione, non un controllo nuovo. Le
+    # immagini decodificate le gestisce la cache di Flutter sul client, non questa.
+    def __init__(self, capacity=TILE_CACHE):
+        self.capacity = capacity
+        self.items = OrderedDict()
+
+    def get(self, key, factory):
+        item = self.items.get(key)
+        if item is None:
+            item = self.items[key] = factory()
+        self.items.move_to_end(key)
+        while len(self.items) > self.capacity:
+            self.items.popitem(last=False)
+        return item
+
+    def clear(self):
+        self.items.clear()
+
+
+class TileViewer:
+    # Pan e pinch ricalcolano solo la posizione del foglio; i tasselli cambiano quando
+    # si attraversa un bordo o si passa a un altro livello. wrap(nome, handler) avvolge
+    # gli handler dei gesti prima di collegarli (es. perf.handler)
+    def __init__(self, request_update, width, height, dpr=1.0, cache_size=TILE_CACHE, resolve=lambda name: name, wrap=lambda name, fn: fn):
+        self.request_update = request_update
+        self.resolve = resolve
+        self.dpr = dpr
+        self.cache = TileCache(cache_size)
+        self.sheet = ft.Stack(left=0, top=0)
+        self.view = ft.Stack(width=width, height=height, clip_behavior=ft.ClipBehavior.HARD_EDGE, controls=[self.sheet])
+        self.control = ft.GestureDetector(
+            content=self.view, drag_interval=30,
+            on_scale_start=wrap("zoom_scale_start", self._on_scale_start), on_scale_update=wrap("zoom_scale_update", self._on_scale_update),
+            on_scroll=wrap("zoom_scroll", self._on_scroll),
+            on_double_tap=wrap("zoom_double_tap", lambda e: self.zoom_by(2 if self.zoom < self.max_zoom else 0, *self._center())),
+        )
+        self.stem = None
+        self.levels = [(1, 1)]
+        self.zoom = self.fit = self.max_zoom = 1.0
+        self.x = self.y = 0.0  # angolo in alto a sinistra della viewport, in pixel della scansione
+        self._pinch = 1.0
+        self._shown = None
+
+    def open(self, img, entry):
+        self.stem = img.rsplit(".", 1)[0]
+        self.levels = [tuple(l) for l in entry["tiles"]["levels"]]
+        self.cache.clear()
+        self._shown = None
+        w, h = self.levels[0]
+        self.fit = min(self.view.width / w, self.view.height / h)
+        self.max_zoom = max(self.fit, MAX_ZOOM)
+        self.zoom = self.fit
+        self.x, self.y = 0.0, 0.0
+        self.layout()
+
+    def close(self):
+        self.cache.clear()
+        self.sheet.controls = []
+        self._shown = None
+
+    def _center(self):
+        return self.view.width / 2, self.view.height / 2
+
+    def zoom_by(self, factor, fx, fy):
+        # Zoom attorno a un punto della viewport (fx, fy), che resta fermo sotto il dito
+        new = min(self.max_zoom, max(self.fit, self.zoom * factor)) if factor else self.fit
+        px, py = self.x + fx / self.zoom, self.y + fy / self.zoom
+        self.zoom = new
+        self.x, self.y = px - fx / new, py - fy / new
+        self.layout()
+
+    def pan(self, dx, dy):
+        self.x -= dx / self.zoom
+        self.y -= dy / self.zoom
+        self.layout()
+
+    def _clamp(self):
+        w, h = self.levels[0]
+        vw, vh = self.view.width / self.zoom, self.view.height / self.zoom
+        # Se la pagina è più piccola della viewport resta centrata
+        self.x = (w - vw) / 2 if vw >= w else min(max(0, self.x), w - vw)
+        self.y = (h - vh) / 2 if vh >= h else min(max(0, self.y), h - vh)
+
+    def layout(self):
+        self._clamp()
+        z, w, h = self.zoom, *self.levels[0]
+        self.sheet.left, self.sheet.top = -self.x * z, -self.y * z
+        self.sheet.width, self.sheet.height = w * z, h * z
+        level = pick_level(self.levels, z, self.dpr)
+        x1, y1 = self.x + self.view.width / z, self.y + self.view.height / z
+        keys = [(level, col, row, rect) for col, row, rect in visible_tiles(self.levels, level, self.x, self.y, x1, y1)]
+        shown = (z, tuple(k[:3] for k in keys))
+        if shown != self._shown:
+            # Sotto, il livello più piccolo (un tassello) copre i buchi mentre arrivano gli altri
+            last = len(self.levels) - 1
+            controls = [self._tile((last, 0, 0), (0, 0, w, h))]
+            if level != last: controls += [self._tile(k[:3], k[3]) for k in keys]
+            self.sheet.controls = controls
+            self._shown = shown
+        self.request_update(self.sheet)
+
+    def _tile(self, key, rect):
+        level, col, row = key
+        img = self.cache.get(key, lambda: ft.Image(src=self.resolve(tile_src(self.stem, level, col, row)), fit=ft.ImageFit.FILL, gapless_playback=True))
+        img.left, img.top, img.width, img.height = (v * self.zoom for v in rect)
+        return img
+
+    def _on_scale_start(self, e):
+        self._pinch = 1.0
+
+    def _on_scale_update(self, e):
+        factor = e.scale / self._pinch if e.scale else 1
+        self._pinch = e.scale or 1
+        if e.focal_point_delta_x or e.focal_point_delta_y:
+            self.x -= (e.focal_point_delta_x or 0) / self.zoom
+            self.y -= (e.focal_point_delta_y or 0) / self.zoom
+        if abs(factor - 1) > 1e-3: self.zoom_by(factor, e.local_focal_point_x or 0, e.local_focal_point_y or 0)
+        else: self.layout()
+
+    def _on_scroll(self, e):
+        # Rotella del mouse: zoom attorno al puntatore
+        if e.scroll_delta_y: self.zoom_by(0.9 if e.scroll_delta_y > 0 else 1 / 0.9, e.local_x or 0, e.local_y or 0)
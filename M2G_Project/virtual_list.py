@@ -0,0 +1,87 @@
+import math
+import re
+from bisect import bisect_left, bisect_right
+
+import flet as ft
+
+# --- LISTA VIRTUALE ---
+# Solo gli elementi vicini alla viewport esistono come controlli; sopra e sotto due
+# spaziatori mantengono l'altezza totale. Le altezze possono essere esatte (pagine,
+# dal manifest) o stimate (testi): servono solo a scegliere la finestra da montare.
+class VirtualList:
+    def __init__(self, build, window=2, **list_props):
+        self.build = build  # (indice, elemento, altezza) -> controllo
+        self.window = window
+        self.items = []
+        self.offsets = [0]
+        self.range = None
+        self.slots = {}
+        self.pixels = 0
+        self.viewport = 800
+        self.top = ft.Container(height=0)
+        self.bottom = ft.Container(height=0)
+        self.control = ft.ListView(spacing=0, **list_props)
+
+    def _set_heights(self, heights):
+        offs = [0]
+        for h in heights: offs.append(offs[-1] + h)
+        self.offsets = offs
+
+    def set_items(self, items, heights, viewport):
+        self.items = items
+        self._set_heights(heights)
+        self.range, self.slots = None, {}
+        self.pixels, self.viewport = 0, viewport
+        self.show(0, min(len(items), bisect_left(self.offsets, viewport) + self.window))
+
+    def show(self, first, last):
+        if (first, last) == self.range: return False
+        offs, slots = self.offsets, self.slots
+        for i in list(slots):
+            if not first <= i < last: del slots[i]
+        for i in range(first, last):
+            if i not in slots: slots[i] = self.build(i, self.items[i], offs[i + 1] - offs[i])
+        self.top.height = offs[first]
+        self.bottom.height = offs[-1] - offs[last]
+        self.control.controls = [self.top] + [slots[i] for i in range(first, last)] + [self.bottom]
+        self.range = (first, last)
+        return True
+
+    def scroll(self, pixels, viewport):
+        # Da on_scroll: True se la finestra è cambiata e la lista va aggiornata
+        self.pixels, self.viewport = pixels, viewport
+        offs = self.offsets
+        first = max(0, bisect_right(offs, pixels) - 1 - self.window)
+        last = min(len(self.items), bisect_left(offs, pixels + viewport) + self.window)
+        return self.show(first, last)
+
+    def visible(self):
+        return [self.slots[i] for i in sorted(self.slots)]
+
+    def resize(self, heights):
+        # Nuove altezze (es. cambio del corpo del testo): si toccano solo gli spaziatori
+        # e gli elementi montati; il resto verrà creato già con i valori nuovi
+        self._set_heights(heights)
+        first, last = self.range or (0, 0)
+        self.range = None
+        self.show(first, last)
+        self.scroll(self.pixels, self.viewport)
+
+
+# --- TESTI A BLOCCHI ---
+CHUNK_MAX_LINES = 12
+TEXT_LINE_HEIGHT = 1.45  # interlinea approssimativa di Text, in multipli del corpo
+TEXT_CHAR_WIDTH = 0.52   # larghezza media di un carattere, in multipli del corpo
+
+def text_chunks(text, max_lines=CHUNK_MAX_LINES):
+    # Strofe o paragrafi (separati da righe vuote); quelli lunghi si spezzano ancora
+    chunks = []
+    for block in re.split(r"\n\s*\n", text.strip("\n")):
+        lines = block.split("\n")
+        for i in range(0, len(lines), max_lines): chunks.append("\n".join(lines[i:i + max_lines]))
+    return chunks
+
+def text_height(chunk, size, width, padding=0):
+    per_line = max(1, int(width / (size * TEXT_CHAR_WIDTH)))
+    lines = sum(max(1, math.ceil(len(line) / per_line)) for line in chunk.split("\n"))
+    return round(lines * size * TEXT_LINE_HEIGHT) + padding
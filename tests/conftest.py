@@ -0,0 +1,5 @@
+import os
+import sys
+
+# I moduli dell'app si importano come nel progetto Flet (import app, import bench)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "M2G_Project"))
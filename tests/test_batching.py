@@ -0,0 +1,16 @@
+import bench
+
+# Trascinamento dello slider (40 eventi a 60 Hz) e nome digitato tasto per tasto:
+# un solo salvataggio delle impostazioni alla fine, update accorpati per frame.
+FONT_DRAG_MAX_UPDATES = 30
+TYPE_NAME_MAX_UPDATES = len("Maria Grazia")
+
+def test_font_drag_writes_once_and_batches_updates():
+    r = bench.run_scenario("font_drag", repeat=1)
+    assert r["storage_writes"] == 1
+    assert r["updates"] <= FONT_DRAG_MAX_UPDATES
+
+def test_type_name_writes_once_and_batches_updates():
+    r = bench.run_scenario("type_name", repeat=1)
+    assert r["storage_writes"] == 1
+    assert r["updates"] <= TYPE_NAME_MAX_UPDATES
@@ -0,0 +1,20 @@
+import re
+
+import bench
+
+# Con uno storage lento (0.2 s a lettura/scrittura) il primo messaggio al client non
+# deve aspettarlo: le letture e scritture passano dal pool di offload().
+STORAGE_DELAY = 0.2
+INPUT_MAX_MS = STORAGE_DELAY * 1000 / 4
+
+def test_slow_storage_does_not_delay_input():
+    for name in ("type_name_home", "open_notes", "open_search"):
+        r = bench.run_scenario(name, repeat=1, storage_delay=STORAGE_DELAY)
+        assert r["input_ms"] < INPUT_MAX_MS, name
+
+def test_reader_back_never_mounts_cancelled_book():
+    # Indietro prima che arrivino le pagine delle Lodi: nessuna loro immagine va al client
+    sent = []
+    bench.run_scenario("open_reader_back", repeat=1, storage_delay=STORAGE_DELAY, inspect=lambda p: sent.extend(p.conn.sent))
+    assert sent
+    assert not any(re.search(r"lodi\d", message) for message in sent)